@@ -1,5 +1,17 @@
 from .publisher import Publisher
 from .subscriber import Subscriber
 from .publisher_subscriber import PublisherSubscriber
+from .token_cache import TokenCache
+from .response_encoding import ResponseEncoder
+from .catalog_client import CatalogClient
+from .heartbeat import Heartbeat
 
-__all__ = ["Publisher", "Subscriber", "PublisherSubscriber"]
+__all__ = [
+    "Publisher",
+    "Subscriber",
+    "PublisherSubscriber",
+    "TokenCache",
+    "ResponseEncoder",
+    "CatalogClient",
+    "Heartbeat",
+]
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import collections
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {502, 503, 504}  # Answers worth another attempt
+
+
+class CatalogClient:
+    """HTTP client of the catalog sharing one keep-alive connection pool, with timeouts, retries and an ETag cache."""
+
+    def __init__(
+        self,
+        base_url,
+        token,
+        timeout=(3.05, 10),
+        retries=3,
+        backoff=0.5,
+        pool_size=4,
+        capacity=64,
+        max_retry_after=10,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout  # Seconds to connect and to wait for each read
+        self.retries = retries  # Attempts after the first one
+        self.backoff = backoff  # Upper bound in seconds of the first retry delay
+        self.capacity = capacity  # GET responses kept at most
+        self.max_retry_after = (
+            max_retry_after  # Longest Retry-After honoured, in seconds
+        )
+        self.hits = 0  # GET requests answered with 304 from the cache
+        self.misses = 0  # GET requests that downloaded the body
+        self._session = requests.Session()
+        self._session.headers.update(
+            {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+        )  # Sent with every request
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size
+        )  # Connections kept open per host, one per concurrent thread
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._cache = (
+            collections.OrderedDict()
+        )  # URL -> (ETag, body), least recently used first
+        self._lock = threading.Lock()
+
+    def request(
+        self, method, path, payload=None, params=None, headers=None, idempotent=True
+    ):
+        """Send a request, retrying failures with jittered exponential backoff, and return the response."""
+        headers = dict(headers or {})
+        if payload is not None:
+            headers["Content-Type"] = "application/json"
+        for attempt in range(self.retries + 1):
+            try:
+                response = self._session.request(
+                    method,
+                    self.base_url + path,
+                    data=json.dumps(payload) if payload is not None else None,
+                    params=params,
+                    headers=headers,
+                    timeout=self.timeout,
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.retries or (
+                    not idempotent and not isinstance(e, requests.ConnectTimeout)
+                ):  # The request may have reached the catalog already
+                    raise
+            else:
+                retry_after = (
+                    response.headers.get("Retry-After")
+                    if response.status_code == 503
+                    else None
+                )  # The catalog refused the request without handling it
+                if (
+                    response.status_code not in RETRY_STATUSES
+                    or attempt == self.retries
+                    or not (idempotent or retry_after)
+                ):  # A gateway error may hide a request the catalog handled
+                    return response
+                if retry_after and retry_after.isdigit():
+                    time.sleep(
+                        min(int(retry_after), self.max_retry_after)
+                    )  # Wait as long as the catalog asked
+                    continue
+            time.sleep(
+                random.uniform(0, self.backoff * 2**attempt)
+            )  # Full jitter, so clients restarted together do not retry together
+
+    def get(self, path, params=None):
+        """Return the decoded JSON of a GET, revalidating the cached copy with its ETag."""
+        url = self.base_url + path
+        cached = None
+        if not params:  # Filtered queries are not cached
+            with self._lock:
+                cached = self._cache.get(url)
+        response = self.request(
+            "GET",
+            path,
+            params=params,
+            headers={"If-None-Match": cached[0]} if cached else None,
+        )
+        if response.status_code == 304 and cached is not None:
+            with self._lock:
+                self.hits += 1
+                if url in self._cache:
+                    self._cache.move_to_end(url)  # Most recently used
+            return json.loads(cached[1])  # Parsed per call, callers may change it
+        response.raise_for_status()
+        etag = response.headers.get("ETag")
+        with self._lock:
+            self.misses += 1
+            if etag and not params:
+                self._cache[url] = (etag, response.content)
+                self._cache.move_to_end(url)
+                if len(self._cache) > self.capacity:
+                    self._cache.popitem(last=False)  # Evict the least recently used
+        return response.json()
+
+    def post(self, path, payload, idempotent=False):
+        """Return the decoded JSON answer to a POST."""
+        response = self.request("POST", path, payload, idempotent=idempotent)
+        response.raise_for_status()
+        return response.json()
+
+    def put(self, path, payload):
+        """Return the decoded JSON answer to a PUT, which is retried like a GET."""
+        response = self.request("PUT", path, payload)
+        response.raise_for_status()
+        return response.json()
+
+    def get_user(self, user_id):
+        return self.get(f"/users/{user_id}")
+
+    def get_dogs(self):
+        return self.get("/dogs")
+
+    def get_stores(self):
+        return self.get("/stores")
+
+    def get_store_summary(self, store_id):
+        return self.get(f"/stores/summary/{store_id}")
+
+    def get_breeds(self):
+        return self.get("/breeds")
+
+    def book_kennel(self, store_id, kennel):
+        return self.post("/book", {"storeID": store_id, "kennel": kennel})
+
+    def free_kennel(self, store_id, kennel):
+        return self.post("/free", {"storeID": store_id, "kennel": kennel})
+
+    def lock_kennel(self, store_id, kennel):
+        return self.post("/lock", {"storeID": store_id, "kennel": kennel})
+
+    def heartbeat(self, category, entity_id):
+        """Report a device ("sensor") or a service as alive."""
+        key = "serviceID" if category == "service" else "deviceID"
+        return self.post(
+            "/heartbeat", {"category": category, key: entity_id}, idempotent=True
+        )
+
+    def heartbeat_batch(self, beats):
+        """Report many devices and services as alive, each given as the body of heartbeat()."""
+        return self.post("/heartbeat/batch", beats, idempotent=True)
+
+    def upsert_devices(self, devices):
+        """Create or replace devices by DeviceID, harmless to repeat."""
+        return self.put("/devices", devices)
+
+    def stats(self):
+        """Return the hit and miss counters and the number of cached responses."""
+        return {"Hits": self.hits, "Misses": self.misses, "Size": len(self._cache)}
+
+    def close(self):
+        """Close the pooled connections."""
+        self._session.close()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+
+import paho.mqtt.client as PahoMQTT
+
+ONLINE = json.dumps({"Available": True})
+OFFLINE = json.dumps({"Available": False})
+
+
+class Heartbeat:
+    """Announces a device or service as alive on <base_topic>/heartbeat/<category>/<ID>, with a Last Will for when it drops."""
+
+    def __init__(
+        self,
+        clientID,
+        broker,
+        port,
+        category,
+        entity_id,
+        base_topic="IoTail",
+        interval=60,
+    ):
+        self.broker = broker
+        self.port = port
+        self.interval = interval  # Seconds between heartbeats
+        self.topic = f"{base_topic}/heartbeat/{category}/{entity_id}"
+        self._paho_mqtt = PahoMQTT.Client(
+            f"{clientID}-heartbeat", True
+        )  # A connection of its own, so the Last Will belongs to this component only
+        self._paho_mqtt.will_set(
+            self.topic, OFFLINE, 1, True
+        )  # Published by the broker if the connection is lost without a disconnect
+        self._paho_mqtt.on_connect = (
+            self.connectNotification
+        )  # Announce the component again after every reconnection
+        self._stopped = threading.Event()
+
+    def connectNotification(self, paho_mqtt, userdata, flags, rc):
+        """Callback for when the client connects to the broker."""
+        if rc == 0:
+            self.beat()
+
+    def beat(self):
+        """Publish one heartbeat, retained so a restarted catalog gets the last state at once."""
+        self._paho_mqtt.publish(self.topic, ONLINE, 0, True)
+
+    def run(self):
+        """Connect to the broker and send a heartbeat every interval until stop() is called."""
+        self._paho_mqtt.connect_async(
+            self.broker, self.port, keepalive=self.interval
+        )  # The broker sends the Last Will after 1.5 intervals without traffic
+        self._paho_mqtt.loop_start()  # Connects and reconnects in the background
+        while not self._stopped.wait(self.interval):
+            self.beat()
+
+    def stop(self):
+        """Announce the component as offline and disconnect, the Last Will is not sent on a clean disconnect."""
+        self._stopped.set()
+        message = self._paho_mqtt.publish(self.topic, OFFLINE, 1, True)
+        if message.rc == PahoMQTT.MQTT_ERR_SUCCESS:  # Not queued while disconnected
+            message.wait_for_publish(timeout=5)
+        self._paho_mqtt.loop_stop()
+        self._paho_mqtt.disconnect()
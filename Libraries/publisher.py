@@ -23,13 +23,19 @@ class Publisher:
         """Callback for when the client connects to the broker."""
         print(f"Connected to {self.broker} with result code {rc}")
 
-    def publish(self, topic, msg, QoS):
+    def publish(self, topic, msg, QoS, retain=False):
         """Publishes a message to a specified topic."""
         self._paho_mqtt.publish(
-            topic, json.dumps(msg), QoS
-        )  # Publish the message to the specified topic
+            topic, json.dumps(msg), QoS, retain
+        )  # Publish the message to the specified topic, kept by the broker if retained
         print(f"Message published on topic {topic}")
 
+    def clear_retained(self, topic):
+        """Removes the retained message of a topic."""
+        self._paho_mqtt.publish(
+            topic, None, 1, True
+        )  # An empty retained message deletes the one stored by the broker
+
     def start(self):
         """Starts the MQTT client and connects to the broker."""
         self._paho_mqtt.connect(self.broker, self.port)  # Connect to the MQTT broker
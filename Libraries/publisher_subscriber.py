@@ -12,7 +12,7 @@ class PublisherSubscriber:
         self.broker = broker
         self.port = port
         self.notifier = notifier
-        self._isSubscriber = False
+        self._topics = {}  # Topic -> QoS, subscribed again on every connection
         self._paho_mqtt = PahoMQTT.Client(
             clientID, True
         )  # Create a new MQTT client instance
@@ -26,43 +26,54 @@ class PublisherSubscriber:
     def connectNotification(self, paho_mqtt, userdata, flags, rc):
         """Callback for when the client connects to the broker."""
         print(f"Connected to {self.broker} with result code {rc}")
+        if rc == 0:  # A clean session starts without subscriptions, restore them
+            for topic, QoS in self._topics.items():
+                self._paho_mqtt.subscribe(topic, QoS)
 
     def messageReceivedNotification(self, paho_mqtt, userdata, msg):
         """Callback for when a message is received on a subscribed topic."""
         self.notifier.notify(msg.topic, msg.payload)
 
-    def publish(self, topic, msg, QoS):
+    def publish(self, topic, msg, QoS, retain=False):
         """Publishes a message to a specified topic."""
         self._paho_mqtt.publish(
-            topic, json.dumps(msg), QoS
-        )  # Publish the message to the specified topic
+            topic, json.dumps(msg), QoS, retain
+        )  # Publish the message to the specified topic, kept by the broker if retained
         print(f"Message published on topic {topic}")
 
+    def clear_retained(self, topic):
+        """Removes the retained message of a topic."""
+        self._paho_mqtt.publish(
+            topic, None, 1, True
+        )  # An empty retained message deletes the one stored by the broker
+
     def start(self):
         """Starts the MQTT client and connects to the broker."""
-        self._paho_mqtt.connect(self.broker, self.port)  # Connect to the MQTT broker
-        self._paho_mqtt.loop_start()  # Start the MQTT loop to process network traffic and dispatch callbacks
+        self._paho_mqtt.connect_async(
+            self.broker, self.port
+        )  # Connect to the MQTT broker once the loop runs, even if it starts later
+        self._paho_mqtt.loop_start()  # Start the MQTT loop to process network traffic, reconnect and dispatch callbacks
 
     def subscribe(self, topic, QoS):
         """Subscribes to a specified topic with a given Quality of Service (QoS)."""
+        self._topics[topic] = QoS  # Store the topic for later use
         self._paho_mqtt.subscribe(
             topic, QoS
-        )  # Subscribe to the specified topic with the given QoS
-        self._isSubscriber = True  # Set the subscriber flag to True
-        self._topic = topic  # Store the topic for later use
-        print(f"Subscribed to {self._topic}")
+        )  # Subscribe to the specified topic with the given QoS, sent on connection if not connected yet
+        print(f"Subscribed to {topic}")
 
     def unsubscribe(self):
-        """Unsubscribes from the currently subscribed topic."""
-        if self._isSubscriber:  # Check if the client is a subscriber
-            self._paho_mqtt.unsubscribe(self._topic)  # Unsubscribe from the topic
-            print(f"Unsubscribed from {self._topic}")
+        """Unsubscribes from the currently subscribed topics."""
+        for topic in self._topics:
+            self._paho_mqtt.unsubscribe(topic)  # Unsubscribe from the topic
+            print(f"Unsubscribed from {topic}")
+        self._topics.clear()  # Not subscribed again on reconnection
 
     def stop(self):
         """Stops the MQTT client and disconnects from the broker."""
-        if self._isSubscriber:  # Check if the client is a subscriber
+        for topic in self._topics:
             self._paho_mqtt.unsubscribe(
-                self._topic
+                topic
             )  # Unsubscribe from the topic before stopping
         self._paho_mqtt.loop_stop()  # Stop the MQTT loop to stop processing network traffic and dispatching callbacks
         self._paho_mqtt.disconnect()  # Disconnect from the MQTT broker
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import collections
+import gzip
+import json
+import threading
+
+try:
+    import msgpack  # Optional, requests for application/msgpack get JSON without it
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard  # Optional, clients get gzip without it
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE = (
+    "text/",
+    "application/json",
+    "application/msgpack",
+)  # Pictures are already compressed, event streams are never buffered
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _preferences(header):
+    """Parse an Accept or Accept-Encoding header into a name -> quality mapping."""
+    preferences = {}
+    for item in header.split(","):
+        name, _, parameters = item.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for parameter in parameters.split(";"):
+            key, _, value = parameter.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        preferences[name] = quality
+    return preferences
+
+
+class ResponseEncoder:
+    """CherryPy tool negotiating MessagePack bodies and gzip or zstd compression, caching encoded bodies by ETag."""
+
+    def __init__(self, min_size=1024, level=6, capacity=256):
+        self.min_size = min_size  # Smaller bodies are sent uncompressed
+        self.level = level  # Compression level of both gzip and zstd
+        self.capacity = capacity  # Encoded bodies kept at most
+        self.hits = 0  # Responses served from the cache
+        self.misses = 0  # Responses that had to be encoded
+        self._cache = (
+            collections.OrderedDict()
+        )  # (ETag, media, coding) -> encoded body, least recently used first
+        self._lock = threading.Lock()
+
+    def tool(self):
+        """Return the CherryPy tool, to register as cherrypy.tools.encode_response."""
+        import cherrypy  # Imported here so services without CherryPy can use the library
+
+        encoder = self
+
+        class EncodeTool(cherrypy.Tool):
+            def _setup(self):
+                cherrypy.Tool._setup(self)  # Encodes the body before_finalize
+                cherrypy.serving.request.hooks.attach(
+                    "before_handler", encoder.strip_validators, priority=40
+                )  # Handlers compare If-None-Match with their own ETags
+
+        return EncodeTool("before_finalize", self.encode, priority=90)
+
+    def negotiate(self, request):
+        """Return the (media, coding) pair to use for a request, each None for JSON and identity."""
+        media = None
+        if msgpack is not None:
+            accept = _preferences(request.headers.get("Accept", ""))
+            if any(accept.get(name, 0) > 0 for name in MSGPACK_TYPES):
+                media = "msgpack"
+        codings = _preferences(request.headers.get("Accept-Encoding", ""))
+        wildcard = codings.get("*", 0)
+        coding = None
+        if zstandard is not None and codings.get("zstd", wildcard) > 0:
+            coding = "zstd"
+        elif codings.get("gzip", wildcard) > 0:
+            coding = "gzip"
+        return media, coding
+
+    @staticmethod
+    def strip_validators():
+        """Remove the encoding suffixes from If-None-Match, remembering the one the client sent."""
+        import cherrypy
+
+        request = cherrypy.serving.request
+        request.etag_suffix = ""
+        if_none_match = request.headers.get("If-None-Match")
+        if not if_none_match:
+            return
+        tags = []
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.endswith('"') and "+" in tag:
+                tag, _, suffix = tag[:-1].partition("+")
+                request.etag_suffix = "+" + suffix
+                tag += '"'
+            tags.append(tag)
+        request.headers["If-None-Match"] = ", ".join(tags)
+
+    def encode(self):
+        """Replace the response body with its negotiated encoding."""
+        import cherrypy
+
+        request = cherrypy.serving.request
+        response = cherrypy.serving.response
+        vary = response.headers.get("Vary")
+        response.headers["Vary"] = (
+            f"{vary}, Accept-Encoding, Accept" if vary else "Accept-Encoding, Accept"
+        )  # Shared caches must keep each representation apart
+        etag = response.headers.get("ETag")
+        status = int(str(response.status or 200).split()[0])
+        if status == 304:
+            if etag and etag.endswith('"'):
+                response.headers["ETag"] = (
+                    etag[:-1] + getattr(request, "etag_suffix", "") + '"'
+                )  # The tag the client revalidated
+            return
+        content_type = response.headers.get("Content-Type", "")
+        if (
+            status != 200
+            or response.stream
+            or "Content-Encoding" in response.headers
+            or not content_type.startswith(COMPRESSIBLE)
+        ):
+            return
+        media, coding = self.negotiate(request)
+        if media is None and coding is None:
+            return
+        key = (etag, media, coding)
+        if etag:
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)  # Most recently used
+                    self.hits += 1
+        else:
+            cached = None
+        if cached is None:
+            cached = self._encode(response.collapse_body(), media, coding)
+            if etag:  # Without an ETag the body may differ on the next request
+                with self._lock:
+                    self.misses += 1
+                    self._cache[key] = cached
+                    if len(self._cache) > self.capacity:
+                        self._cache.popitem(last=False)  # Evict the least recently used
+        body, media, coding = cached
+        if media is None and coding is None:  # Small body that stays as it is
+            return
+        suffix = "".join(f"+{name}" for name in (media, coding) if name)
+        if etag and etag.endswith('"'):
+            response.headers["ETag"] = (
+                etag[:-1] + suffix + '"'
+            )  # Each representation has its own strong ETag
+        if media:
+            response.headers["Content-Type"] = "application/msgpack"
+        if coding:
+            response.headers["Content-Encoding"] = coding
+        response.body = [body]
+
+    def _encode(self, body, media, coding):
+        """Return (body, media, coding) with the encodings that were actually applied."""
+        if media:
+            try:
+                body = msgpack.packb(json.loads(body), use_bin_type=True)
+            except ValueError:  # Not a JSON body, e.g. the HTML status page
+                media = None
+        if len(body) < self.min_size:
+            coding = None  # Not worth the compression overhead
+        elif coding == "zstd":
+            body = zstandard.ZstdCompressor(level=self.level).compress(body)
+        elif coding == "gzip":
+            body = gzip.compress(body, compresslevel=self.level, mtime=0)
+        return body, media, coding
+
+    def stats(self):
+        """Return the hit and miss counters and the number of cached bodies."""
+        return {"Hits": self.hits, "Misses": self.misses, "Size": len(self._cache)}
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import collections
+import threading
+import time
+
+
+class TokenCache:
+    """Bounded LRU cache of verified JWT tokens, each kept until its own exp claim."""
+
+    def __init__(self, secret_key, service_tokens=(), capacity=1024):
+        self.secret_key = secret_key
+        self.service_tokens = set(
+            service_tokens
+        )  # Fixed tokens of the other services, accepted without verification
+        self.capacity = capacity
+        self.hits = 0  # Requests answered from the cache
+        self.misses = 0  # Requests that had to run jwt.decode
+        self._tokens = collections.OrderedDict()  # token -> (decoded claims, exp)
+        self._lock = threading.Lock()
+
+    def authorize(self, auth_header):
+        """Parse an "Authorization: Bearer <token>" header and verify the token."""
+        import cherrypy  # Imported here so services without CherryPy can use the library
+
+        if not auth_header:
+            raise cherrypy.HTTPError(401, "Authorization token required")
+        scheme, _, token = auth_header.strip().partition(" ")
+        if scheme.lower() != "bearer" or not token.strip():
+            raise cherrypy.HTTPError(401, "Invalid authorization header")
+        return self.verify(token.strip())
+
+    def verify(self, token):
+        """Return the decoded claims of a token, or raise an HTTP error if it is invalid."""
+        import cherrypy
+        import jwt  # Imported here so services without PyJWT can use the library
+
+        if token in self.service_tokens:
+            return token
+        now = time.time()
+        with self._lock:
+            cached = self._tokens.get(token)
+            if cached is not None and cached[1] > now:
+                self._tokens.move_to_end(token)  # Most recently used
+                self.hits += 1
+                return cached[0]
+            if cached is not None:  # Expired since it was cached
+                del self._tokens[token]
+            self.misses += 1
+        try:
+            decoded = jwt.decode(
+                token, self.secret_key, algorithms=["HS256"]
+            )  # Decode the JWT token using the secret key
+        except jwt.ExpiredSignatureError:  # If the token has expired
+            raise cherrypy.HTTPError(401, "Token has expired")
+        except jwt.InvalidTokenError:  # If the token is invalid
+            raise cherrypy.HTTPError(401, "Invalid token")
+        if "exp" in decoded:  # Tokens without an expiration are verified every time
+            with self._lock:
+                self._tokens[token] = (decoded, decoded["exp"])
+                self._tokens.move_to_end(token)
+                if len(self._tokens) > self.capacity:
+                    self._tokens.popitem(last=False)  # Evict the least recently used
+        return decoded
+
+    def stats(self):
+        """Return the hit and miss counters and the number of cached tokens."""
+        return {"Hits": self.hits, "Misses": self.misses, "Size": len(self._tokens)}
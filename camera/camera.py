@@ -1,16 +1,15 @@
-from Libraries import Subscriber
+from Libraries import Subscriber, Heartbeat
 import json
 import time
 import subprocess
 import sys
 import socket
-import requests
 import threading
 import signal
 
 
 class Camera:
-    def __init__(self, clientID, broker, port, ip, deviceID):
+    def __init__(self, clientID, broker, port, baseTopic, ip, deviceID):
         self.clientID = clientID
         self.deviceID = deviceID
         self.broker = broker
@@ -20,9 +19,9 @@ class Camera:
         )  # Initialize the MQTT client
         self.stream_process = None
         self.ip = ip
-        self.catalog_url = json.load(open("settings.json"))[
-            "catalog_url"
-        ]  # Load catalog URL from settings
+        self.beats = Heartbeat(
+            clientID, broker, port, "sensor", deviceID, base_topic=baseTopic
+        )  # Heartbeats and Last Will on IoTail/heartbeat/sensor/<ID>
 
     def start(self):
         """Starts the MQTT client and connects to the broker"""
@@ -51,6 +50,7 @@ class Camera:
 
     def stop(self):
         """Stops the MQTT client and cleans up resources"""
+        self.beats.stop()  # Announce the component as offline
         self.client.stop()  # Stop the MQTT client
 
     def run(self):
@@ -80,30 +80,8 @@ class Camera:
         )  # Execute the command to stop the stream
 
     def heartbeat(self):
-        """Sends a heartbeat signal to the catalog service every 60 seconds"""
-        while True:
-            try:
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": "Bearer camera",
-                }
-                url = self.catalog_url + "/heartbeat"
-                payload = {
-                    "category": "sensor",
-                    "deviceID": self.deviceID,
-                }
-                response = requests.post(
-                    url, headers=headers, data=json.dumps(payload)
-                )  # Send heartbeat to the catalog service
-                if response.status_code == 200:  # if response is ok
-                    print("Heartbeat sent successfully")
-                else:  # if response is not ok
-                    print("Failed to send heartbeat")
-            except (
-                requests.exceptions.RequestException
-            ) as e:  # Handle any request exceptions
-                print(f"Error sending heartbeat: {e}")
-            time.sleep(60)  # Wait for 60 seconds before sending the next heartbeat
+        """Announces the camera as alive on MQTT every 60 seconds, until stop() is called."""
+        self.beats.run()
 
 
 def signal_handler(sig, frame):
@@ -119,7 +97,7 @@ if __name__ == "__main__":
     ip = s.getsockname()[0]  # Get the local IP address
     s.close()
     camera = Camera(
-        "Camera", settings["broker"], settings["port"], ip, 6
+        "Camera", settings["broker"], settings["port"], settings["baseTopic"], ip, 6
     )  # Instantiate the Camera class
     camera.start()  # Start the MQTT client
 
@@ -3,28 +3,230 @@ import json
 import time
 import os
 import socket
-import bcrypt
 import uuid
 import jwt
 import datetime
 from dotenv import load_dotenv
 import secrets
 import string
-import requests
-import shutil
+import math
 from cherrypy.lib import static
 import threading
+from storage import JsonStorage, SqliteStorage
+from liveness import LivenessRegistry
+from response_cache import ResponseCache
+from change_feed import ChangeFeed
+from Libraries import PublisherSubscriber, TokenCache, ResponseEncoder
+from geo import GridIndex
+from password_hasher import PasswordHasher
+from outbox import Outbox, MailgunTransport, FakeMailgun
+from code_store import CodeStore
+from errors import RetryLater
+from images import ImagePipeline
+from uploads import SpoolFile
+from status_page import StatusEvents, render_page, render_json
+from snapshots import Snapshot, SnapshotStore
 
 
 class Catalog:
     exposed = True
 
+    # Durability of each mutating endpoint: "sync" writes the catalog before answering,
+    # "deferred" leaves the write to the background flusher. Override with CATALOG_DURABILITY.
+    durability = {
+        "register": "sync",
+        "reset_password": "sync",
+        "edit_user": "sync",
+        "delete_user": "sync",
+        "add_dog": "sync",
+        "edit_dog": "sync",
+        "delete_dog": "sync",
+        "profile_picture": "sync",
+        "dog_picture": "sync",
+        "book": "sync",
+        "lock": "sync",
+        "free": "sync",
+        "login": "deferred",
+        "logout": "deferred",
+        "devices": "deferred",
+        "services": "deferred",
+        "availability": "deferred",
+    }
+    default_thresholds = {
+        "MinIdealTemperature": 15,
+        "MaxIdealTemperature": 30,
+        "MinIdealHumidity": 20,
+        "MaxIdealHumidity": 80,
+    }  # Comfort range of dogs whose breed or own values are missing
+    kennel_sizes = [
+        "Small",
+        "Medium",
+        "Large",
+    ]  # A kennel can host dogs of its size or smaller
+    max_nearby_stores = 50  # Largest limit of GET /stores/nearby
+    max_nearby_radius_km = 500  # Largest radius of GET /stores/nearby
+    collection_routes = {
+        "users": (
+            "Users",
+            "UserID",
+            {"UserID": "users_by_id", "Email": "users_by_email"},
+        ),
+        "stores": ("Stores", "StoreID", {"StoreID": "stores_by_id"}),
+        "devices": ("Devices", "DeviceID", {"DeviceID": "devices_by_id"}),
+        "services": ("Services", "ServiceID", {"ServiceID": "services_by_id"}),
+        "breeds": ("Breeds", "BreedID", {"BreedID": "breeds_by_id"}),
+    }  # Route -> (collection, ID field, indexed field -> index attribute) for fields/filter/limit
+    snapshot_sources = {
+        "Dogs": "Users",
+        "StoreSummaries": "Stores",
+    }  # Snapshots derived from another collection, invalidated when it changes
+    lock_free_routes = {
+        "POST": {"register", "login", "confirm_registration", "recover", "heartbeat"},
+        "PUT": {"reset_password"},
+    }  # Routes that hash passwords or only record heartbeats, they lock around their mutations only
+
     def __init__(self):
-        self.catalog_data = self.load_catalog()  # Load the catalog data from JSON file
+        load_dotenv()  # for reading API key from `.env` file.
+        self.durability = dict(self.durability)
+        for entry in os.getenv("CATALOG_DURABILITY", "").split(","):
+            if "=" in entry:  # Entries look like "book=deferred"
+                endpoint, level = entry.split("=", 1)
+                self.durability[endpoint.strip()] = level.strip()
+        interval_ms = int(os.getenv("CATALOG_FLUSH_INTERVAL_MS", 500))
+        max_mutations = int(os.getenv("CATALOG_FLUSH_MAX_MUTATIONS", 100))
+        self.writer = (
+            threading.RLock()
+        )  # Serializes every mutation of the catalog data and its indexes
+        json_path = os.getenv(
+            "CATALOG_JSON_PATH", "data/catalog.json"
+        )  # Inside a mounted directory, a file bind-mounted on its own cannot be renamed over
+        if (
+            os.getenv("CATALOG_STORAGE", "json") == "sqlite"
+        ):  # SQLite database with row-level updates, migrated from catalog.json once
+            self.storage = SqliteStorage(
+                os.getenv("CATALOG_DB_PATH", "db/catalog.db"),
+                json_path,
+                interval_ms=interval_ms,
+                max_mutations=max_mutations,
+            )
+        else:  # Write-behind JSON file that coalesces mutations into one snapshot
+            self.storage = JsonStorage(
+                json_path,
+                lambda: self.catalog_data,
+                interval_ms=interval_ms,
+                max_mutations=max_mutations,
+                lock=self.writer,
+            )
+        self.catalog_data = self.load_catalog()  # Load the catalog data from storage
+        self.build_indexes()  # Build the lookup indexes over the catalog data
+        liveness_windows = {
+            "sensor": 180,
+            "service": 180,
+        }  # Seconds without heartbeats before a device or service is unavailable
+        for entry in os.getenv("CATALOG_LIVENESS_WINDOWS", "").split(","):
+            if "=" in entry:  # Entries look like "sensor=60"
+                category, seconds = entry.split("=", 1)
+                liveness_windows[category.strip()] = float(seconds)
+        self.responses = (
+            ResponseCache()
+        )  # Serialized GET responses, invalidated by version counters
+        self.snapshots = SnapshotStore(
+            self.writer
+        )  # Copies of the collections that readers use without locking
+        self.change_feed = ChangeFeed(
+            self.responses.boot, int(os.getenv("CATALOG_CHANGE_FEED_SIZE", 1000))
+        )  # Recent entity-level mutations served by GET /changes
+        self.liveness = LivenessRegistry(
+            liveness_windows
+        )  # Heartbeats are kept in memory and merged into responses at read time
+        for device in self.catalog_data["Devices"]:
+            self.liveness.seed(
+                "sensor", device["DeviceID"], device.get("LastAvailable")
+            )
+        for service in self.catalog_data.get("Services", []):
+            self.liveness.seed(
+                "service", service["ServiceID"], service.get("LastAvailable")
+            )
+        self.checkpoint_interval = int(
+            os.getenv("CATALOG_LIVENESS_CHECKPOINT_S", 300)
+        )  # Seconds between liveness checkpoints into storage, 0 disables them
+        settings = json.load(open("mqtt_settings.json"))  # Load MQTT settings
+        self.base_topic = (
+            settings["baseTopic"] + "/catalog"
+        )  # Entity state is published under IoTail/catalog/...
+        self.heartbeat_topic = (
+            settings["baseTopic"] + "/heartbeat"
+        )  # Components announce themselves under IoTail/heartbeat/<category>/<ID>
+        self.client = PublisherSubscriber(
+            "Catalog", settings["broker"], settings["port"], self
+        )  # Initialize MQTT client, notify() receives the heartbeats
+        self.liveness.subscribe(
+            self.publish_liveness
+        )  # Publish availability transitions of devices and services
+        self.status_events = StatusEvents(
+            max_clients=int(os.getenv("CATALOG_STATUS_STREAM_CLIENTS", 4))
+        )
+        self.liveness.subscribe(
+            self.status_events.notify
+        )  # Push transitions to the status stream and invalidate the cached status views
+        self.hasher = PasswordHasher(
+            workers=int(os.getenv("CATALOG_BCRYPT_WORKERS", 2)),
+            max_queue=int(os.getenv("CATALOG_BCRYPT_QUEUE", 16)),
+            rounds=int(os.getenv("CATALOG_BCRYPT_ROUNDS", 12)),
+        )  # bcrypt runs in worker processes, not on the request threads
+        self.images = ImagePipeline(
+            workers=int(os.getenv("CATALOG_IMAGE_WORKERS", 2)),
+            quality=int(os.getenv("CATALOG_IMAGE_QUALITY", 82)),
+        )  # Pictures are resized and re-encoded off the request threads
+        self.upload_directory = os.path.join(
+            self.images.directory, "uploads"
+        )  # On the pictures volume, so finished uploads are moved, not copied
+        self.max_upload_size = (
+            int(os.getenv("CATALOG_MAX_UPLOAD_MB", 10)) * 1024 * 1024
+        )  # Larger pictures are rejected while they are uploaded
+        self.sendfile_prefix = os.getenv(
+            "CATALOG_SENDFILE_PREFIX", ""
+        )  # Internal location of the pictures on an nginx in front of the catalog, if any
+        if (
+            os.getenv("MAIL_TRANSPORT") == "fake"
+        ):  # Keep e-mails in memory instead of calling Mailgun
+            transport = FakeMailgun()
+        else:
+            transport = MailgunTransport(
+                os.getenv("MAILGUN_API_URL"),  # Read the API URL from .env file
+                os.getenv("MAILGUN_API_KEY"),  # Read the API key from .env file
+                os.getenv("FROM_EMAIL_ADDRESS"),  # Read the sender email from .env file
+            )
+        self.outbox = Outbox(
+            os.getenv("CATALOG_OUTBOX_PATH", "db/outbox.db"),
+            transport,
+            workers=int(os.getenv("CATALOG_MAIL_WORKERS", 2)),
+        )  # E-mails are stored here and sent in the background
+        self.register_mail_wait = float(
+            os.getenv("CATALOG_REGISTER_MAIL_WAIT_S", 2)
+        )  # Seconds register waits for the first delivery attempt, 0 to not wait
         with open("secret_key.txt") as f:
             self.secret_key = f.read()  # Read the secret key from a file
-        load_dotenv()  # for reading API key from `.env` file.
-        self.codes = []  # Store registration and recovery codes in memory
+        self.tokens = TokenCache(
+            self.secret_key,
+            [
+                "reservation_manager",
+                "data_analysis",
+                "temp_humid_sensor",
+                "motion_sensor",
+                "led_connector",
+                "device_connector",
+                "camera",
+                "thingspeak_adaptor",
+                "disinfection_system",
+            ],  # Allow specific tokens without verification for simplicity
+        )  # Verified JWT tokens, kept until they expire
+        self.codes = CodeStore(
+            ttl=int(os.getenv("CATALOG_CODE_TTL_S", 900)),
+            max_attempts=int(os.getenv("CATALOG_CODE_MAX_ATTEMPTS", 5)),
+            min_interval=int(os.getenv("CATALOG_CODE_MIN_INTERVAL_S", 60)),
+            max_per_hour=int(os.getenv("CATALOG_CODE_MAX_PER_HOUR", 5)),
+        )  # Registration and recovery codes, expiring and throttled per e-mail
 
     def generate_token(
         self,
@@ -43,37 +245,10 @@ class Catalog:
         )  # Generate a JWT token with user ID and expiration time
         return token
 
-    def verify_token(self, token):
-        """Verify the JWT token and return the decoded data or raise an error."""
-        if token in [
-            "reservation_manager",
-            "data_analysis",
-            "temp_humid_sensor",
-            "motion_sensor",
-            "led_connector",
-            "camera",
-            "thingspeak_adaptor",
-            "disinfection_system",
-        ]:  # Allow specific tokens without verification for simplicity
-            return token
-        try:
-            decoded = jwt.decode(
-                token, self.secret_key, algorithms=["HS256"]
-            )  # Decode the JWT token using the secret key
-            return decoded
-        except (
-            jwt.ExpiredSignatureError
-        ):  # If the token has expired, return an HTTP error
-            raise cherrypy.HTTPError(401, "Token has expired")
-        except jwt.InvalidTokenError:  # If the token is invalid, return an HTTP error
-            raise cherrypy.HTTPError(401, "Invalid token")
-
     def load_catalog(self):
-        """Load the catalog data from a JSON file or create a new catalog if the file does not exist."""
-        try:
-            with open("catalog.json") as f:
-                return json.load(f)  # Load the catalog data from JSON file
-        except FileNotFoundError:  # If the file does not exist, create a new catalog
+        """Load the catalog data from storage or create a new catalog if nothing is stored yet."""
+        catalog_data = self.storage.load()  # Load the catalog data from storage
+        if catalog_data is None:  # If there is no stored catalog, create a new one
             return {
                 "broker": {},
                 "Breeds": [],
@@ -84,101 +259,254 @@ class Catalog:
                 "Bookings": [],
                 "Services": [],
             }
+        return catalog_data
+
+    def build_indexes(self):
+        """Build the hash indexes used to look up catalog entities without scanning lists."""
+        self.users_by_id = {}  # UserID -> user
+        self.users_by_email = {}  # Email -> user
+        self.dogs_by_id = {}  # (UserID, DogID) -> dog
+        self.resolved_dogs = {}  # DogID -> dog with UserID and effective thresholds
+        self.stores_by_id = {}  # StoreID -> store
+        self.kennels_by_id = {}  # (StoreID, kennel ID) -> kennel
+        self.kennel_status = (
+            {}
+        )  # (StoreID, kennel ID) -> "Free", "Booked" or "Occupied"
+        self.kennel_counts = {}  # StoreID -> kennel size -> status -> number of kennels
+        self.store_grid = GridIndex()  # Store locations for nearest-store searches
+        self.devices_by_id = {}  # DeviceID -> device
+        self.services_by_id = {}  # ServiceID -> service
+        self.breeds_by_id = {}  # BreedID -> breed
+        self.picture_refs = {}  # Picture -> number of users and dogs showing it
+        for breed in self.catalog_data.get(
+            "Breeds", []
+        ):  # Breeds first, dogs are resolved against them
+            self.breeds_by_id.setdefault(breed["BreedID"], breed)
+        for user in self.catalog_data.get("Users", []):
+            self.index_user(user)
+            for picture in [user["ProfilePicture"]] + [
+                dog["Picture"] for dog in user["Dogs"]
+            ]:
+                if picture:
+                    self.picture_refs[picture] = self.picture_refs.get(picture, 0) + 1
+        for store in self.catalog_data.get("Stores", []):
+            self.stores_by_id.setdefault(store["StoreID"], store)
+            if store.get("Location"):  # Location is [latitude, longitude]
+                self.store_grid.insert(
+                    store["Location"][0], store["Location"][1], store
+                )
+            for kennel in store["Kennels"]:
+                self.kennels_by_id.setdefault((store["StoreID"], kennel["ID"]), kennel)
+                self.count_kennel(store["StoreID"], kennel)
+        for device in self.catalog_data.get("Devices", []):
+            self.index_device(device)
+        for service in self.catalog_data.get("Services", []):
+            self.index_service(service)
+
+    def index_user(self, user):
+        """Add a user and all of their dogs to the indexes."""
+        self.users_by_id.setdefault(user["UserID"], user)
+        self.users_by_email.setdefault(user["Email"], user)
+        for dog in user["Dogs"]:
+            self.dogs_by_id.setdefault((user["UserID"], dog["DogID"]), dog)
+            self.resolved_dogs[dog["DogID"]] = self.resolve_dog(user["UserID"], dog)
+
+    def unindex_user(self, user):
+        """Remove a user and all of their dogs from the indexes."""
+        if self.users_by_id.get(user["UserID"]) is user:
+            del self.users_by_id[user["UserID"]]
+        if self.users_by_email.get(user["Email"]) is user:
+            del self.users_by_email[user["Email"]]
+        for dog in user["Dogs"]:
+            self.dogs_by_id.pop((user["UserID"], dog["DogID"]), None)
+            self.resolved_dogs.pop(dog["DogID"], None)
+
+    def count_kennel(self, store_id, kennel):
+        """Move a kennel between the free, booked and occupied counters of its store."""
+        key = (store_id, kennel["ID"])
+        if kennel[
+            "Occupied"
+        ]:  # A locked kennel is occupied whether or not it was booked
+            status = "Occupied"
+        elif kennel["Booked"]:
+            status = "Booked"
+        else:
+            status = "Free"
+        previous = self.kennel_status.get(key)
+        if previous == status:
+            return
+        counts = self.kennel_counts.setdefault(store_id, {}).setdefault(
+            kennel["Size"], {"Free": 0, "Booked": 0, "Occupied": 0}
+        )
+        if previous is not None:
+            counts[previous] -= 1
+        counts[status] += 1
+        self.kennel_status[key] = status
+
+    def free_kennels_for(self, counts, size):
+        """Return how many free kennels in the counters of a store can host a dog of the given size."""
+        return sum(
+            counts[kennel_size]["Free"]
+            for kennel_size in self.kennel_sizes[self.kennel_sizes.index(size) :]
+            if kennel_size in counts
+        )
 
-    def save_catalog(self):
-        """Save the catalog data to a JSON file."""
-        try:
-            with open("catalog.json", "w") as f:
-                json.dump(
-                    self.catalog_data, f, indent=4
-                )  # Save the catalog data to JSON file
-        except IOError as e:  # If there is an error saving the file, raise an error
-            print(f"Error saving catalog: {e}")
+    def store_summary(self, store):
+        """Return a store with its kennel counters instead of its kennels and unlock codes."""
+        return {
+            "StoreID": store["StoreID"],
+            "Name": store["Name"],
+            "Location": store.get("Location"),
+            "Kennels": self.kennel_counts.get(store["StoreID"], {}),
+        }
+
+    def resolve_dog(self, user_id, dog):
+        """Return a copy of a dog with its owner and the comfort range it should be kept in."""
+        if dog.get("BreedID", 0) != 0:  # Dogs of a known breed use the breed's range
+            source = self.breeds_by_id.get(dog["BreedID"], {})
+        else:  # Mixed breed dogs carry their own range
+            source = dog
+        return dict(
+            dog,
+            UserID=user_id,
+            **{
+                field: source.get(field, default)
+                for field, default in self.default_thresholds.items()
+            },
+        )
+
+    def index_device(self, device):
+        """Add a device to the DeviceID index, keeping the first entry on duplicates."""
+        if "DeviceID" in device:
+            self.devices_by_id.setdefault(device["DeviceID"], device)
+
+    def upsert_devices(self, devices):
+        """Create or replace devices by DeviceID, leaving unchanged ones untouched so repeating the call is harmless."""
+        if not all(
+            isinstance(device, dict) and isinstance(device.get("DeviceID"), (int, str))
+            for device in devices
+        ):  # Checked before changing anything
+            raise cherrypy.HTTPError(400, "Every device requires a DeviceID")
+        created = updated = unchanged = 0
+        for device in devices:
+            stored = self.devices_by_id.get(device["DeviceID"])
+            if stored is None:
+                stored = dict(device)
+                self.catalog_data["Devices"].append(stored)
+                self.index_device(stored)
+                created += 1
+            else:
+                merged = dict(device)
+                for field in ("LastAvailable", "Available"):
+                    if field in stored and field not in device:
+                        merged[field] = stored[
+                            field
+                        ]  # Liveness is kept by the catalog, not by the gateway
+                if merged == stored:
+                    unchanged += 1
+                    continue
+                stored.clear()  # Updated in place, keeping its position in the Devices list
+                stored.update(merged)
+                updated += 1
+            self.storage.put_device(stored)  # Deferred, written once below
+            self.changed(
+                "Devices", "device", "put", {"DeviceID": stored["DeviceID"]}, stored
+            )
+        if (
+            created + updated and self.durability_of("devices") == "sync"
+        ):  # One write for the whole batch
+            self.storage.flush()
+        return json.dumps(
+            {
+                "status": "success",
+                "Created": created,
+                "Updated": updated,
+                "Unchanged": unchanged,
+            }
+        )
+
+    def index_service(self, service):
+        """Add a service to the ServiceID index, keeping the first entry on duplicates."""
+        if "ServiceID" in service:
+            self.services_by_id.setdefault(service["ServiceID"], service)
+
+    def durability_of(self, endpoint):
+        """Return the durability level ("sync" or "deferred") configured for the endpoint."""
+        return self.durability.get(endpoint, "sync")
+
+    def flush(self):
+        """Write every pending mutation to disk, used on shutdown."""
+        self.storage.flush()
 
     def register(self, email):
         """Prepare a new user for registration by sending a confirmation email with a secure code."""
-        email_list = [
-            user["Email"] for user in self.catalog_data["Users"]
-        ]  # Get a list of existing emails from the catalog
         if (
-            email in email_list
+            email in self.users_by_email
         ):  # Check if the email already exists in the catalog, if it does, return an HTTP error because we do not allow duplicate registrations
             raise cherrypy.HTTPError(400, "Email already exists")
-        secure_code = (
-            self.generate_secure_code()
-        )  # Generate a secure code for registration to send to the user
-        api_key = os.getenv("MAILGUN_API_KEY")  # Read the API key from .env file
-        api_url = os.getenv("MAILGUN_API_URL")  # Read the API URL from .env file
-        from_address = os.getenv(
-            "FROM_EMAIL_ADDRESS"
-        )  # Read the sender email from .env file
-        response = requests.post(
-            api_url,
-            auth=("api", api_key),
-            data={
-                "from": from_address,
-                "to": email,
-                "subject": "IoTail registration code",
-                "text": f"Dear user,\nuse this code to confirm your registration: {secure_code}",
-            },
-        )  # Send a POST request to the Mailgun API to send the confirmation email to the user
-        if response.status_code == 200:  # If the response is ok
-            self.codes.append(
-                {"email": email, "code": secure_code}
-            )  # Save a dictionary with the email and code to the codes list to be used later for check
-            return json.dumps(
-                {
-                    "status": "success",
-                    "message": "Confirm registration email sent",
-                }
-            )
-        raise cherrypy.HTTPError(
-            500, "Error sending confirm registration email"
-        )  # If the response is not ok, return an HTTP error
+        secure_code = self.issue_code(
+            "register", email
+        )  # Generate and save the code to be checked on confirmation
+        message_id = self.outbox.enqueue(
+            email,
+            "IoTail registration code",
+            f"Dear user,\nuse this code to confirm your registration: {secure_code}",
+        )  # Queue the confirmation email, it is sent by the outbox in the background
+        if (
+            self.register_mail_wait > 0
+            and self.outbox.wait(message_id, self.register_mail_wait) == "failed"
+        ):  # Mailgun rejected the address on the first attempt
+            raise cherrypy.HTTPError(500, "Error sending confirm registration email")
+        return json.dumps(
+            {
+                "status": "success",
+                "message": "Confirm registration email sent",
+            }
+        )
 
     def confirm_registration(self, body):
         """Confirm the registration of a new user by verifying the registration code and saving the user data."""
         email = body["email"]
         registration_code = body["registration_code"]
-        if not self.verify_code(
-            email, registration_code
-        ):  # Check if the registration code is valid or return an HTTP error
+        if not self.codes.peek(
+            "register", email, registration_code
+        ):  # Check the code first, wrong codes must not cost a bcrypt hash
+            raise cherrypy.HTTPError(401, "Invalid registration code")
+        hashed_password = self.hasher.hash(
+            body["password"]
+        )  # Hash the password before using up the code, the pool may be saturated
+        if not self.codes.verify(
+            "register", email, registration_code
+        ):  # Used up by a concurrent confirmation meanwhile
             raise cherrypy.HTTPError(401, "Invalid registration code")
-        hashed_password = bcrypt.hashpw(
-            body["password"].encode("utf-8"), bcrypt.gensalt()
-        ).decode(
-            "utf-8"
-        )  # Hash the password using bcrypt
         userID = str(uuid.uuid4())  # Generate a unique user ID using UUID
-        self.catalog_data["Users"].append(
-            {
-                "UserID": userID,
-                "Name": body["name"],
-                "Email": email,
-                "Password": hashed_password,
-                "PhoneNumber": body["phone"],
-                "ProfilePicture": None,
-                "FirebaseTokens": [body["firebaseToken"]],
-                "Dogs": [],
-            }
-        )  # Append a new user dictionary to the Users list in the catalog data
-        self.save_catalog()  # Save the updated catalog data to the JSON file
+        user = {
+            "UserID": userID,
+            "Name": body["name"],
+            "Email": email,
+            "Password": hashed_password,
+            "PhoneNumber": body["phone"],
+            "ProfilePicture": None,
+            "FirebaseTokens": [body["firebaseToken"]],
+            "Dogs": [],
+        }
+        with self.writer:
+            if email in self.users_by_email:  # Registered by a concurrent confirmation
+                raise cherrypy.HTTPError(400, "Email already exists")
+            self.catalog_data["Users"].append(
+                user
+            )  # Append a new user dictionary to the Users list in the catalog data
+            self.index_user(user)  # Add the new user to the indexes
+            self.storage.put_user(
+                user, self.durability_of("register")
+            )  # Persist the updated user
+            self.changed("Users", "user", "put", {"UserID": user["UserID"]}, user)
         token = self.generate_token(userID)  # Generate a JWT token for the new user
-        api_key = os.getenv("MAILGUN_API_KEY")  # Read the API key from .env file
-        api_url = os.getenv("MAILGUN_API_URL")  # Read the API URL from .env file
-        from_address = os.getenv(
-            "FROM_EMAIL_ADDRESS"
-        )  # Read the sender email from .env file
-        requests.post(
-            api_url,
-            auth=("api", api_key),
-            data={
-                "from": from_address,
-                "to": email,
-                "subject": "Welcome to IoTail",
-                "text": f"Dear user,\nwe welcome you to IoTail. Enjoy our services!",
-            },
-        )  # Send a welcome email to the new user using the Mailgun API
+        self.outbox.enqueue(
+            email,
+            "Welcome to IoTail",
+            f"Dear user,\nwe welcome you to IoTail. Enjoy our services!",
+        )  # Queue a welcome email to the new user
         return json.dumps(
             {
                 "status": "success",
@@ -194,37 +522,53 @@ class Catalog:
         characters = string.ascii_letters + string.digits
         return "".join(secrets.choice(characters) for _ in range(length))
 
-    def verify_code(self, email, code):
-        """Verify the registration or recovery code for a given email."""
-        for i, entry in enumerate(self.codes):
-            if entry["email"] == email and entry["code"] == code:
-                del self.codes[i]  # Remove the code after verification to prevent reuse
-                return True
-        return False
+    def issue_code(self, purpose, email):
+        """Generate and save a code for an e-mail, refusing one that received a code too recently or too often."""
+        code = self.generate_secure_code()
+        if not self.codes.try_issue(purpose, email, code):
+            raise RetryLater(
+                429, "Too many codes requested, retry later", self.codes.min_interval
+            )
+        return code
 
     def login(self, body):
         """Log in a user by verifying their email and password, and return a JWT token."""
-        user = next(
-            (u for u in self.catalog_data["Users"] if u["Email"] == body["email"]),
-            None,
-        )  # Find the user by email in the Users list of the catalog data
-        if user and bcrypt.checkpw(
-            body["password"].encode("utf-8"), user["Password"].encode("utf-8")
+        user = self.users_by_email.get(
+            body["email"]
+        )  # Find the user by email in the email index
+        if user and self.hasher.verify(
+            body["password"], user["Password"]
         ):  # Check if the user exists and if the password matches the hashed password
+            if self.hasher.needs_rehash(
+                user["Password"]
+            ):  # Upgrade the hash to the configured cost while the password is at hand
+                upgraded = self.hasher.hash(body["password"])  # Outside the lock
+                with self.writer:
+                    user["Password"] = upgraded
+                    self.storage.put_user(user, self.durability_of("login"))
+                    self.changed(
+                        "Users", "user", "put", {"UserID": user["UserID"]}, user
+                    )
             token = self.generate_token(
                 user["UserID"]
             )  # Generate a JWT token for the user
             firebaseToken = body.get(
                 "firebaseToken", None
             )  # Get the firebase token from the request body if it exists
-            if (
-                firebaseToken is not None
-                and firebaseToken not in user["FirebaseTokens"]
-            ):  # If the firebase token is provided and not already in the user's FirebaseTokens list
-                user["FirebaseTokens"].append(
-                    body["firebaseToken"]
-                )  # Append the firebase token to the user's FirebaseTokens list
-                self.save_catalog()  # Save the updated catalog data to the JSON file
+            with self.writer:
+                if (
+                    firebaseToken is not None
+                    and firebaseToken not in user["FirebaseTokens"]
+                ):  # If the firebase token is provided and not already in the user's FirebaseTokens list
+                    user["FirebaseTokens"].append(
+                        body["firebaseToken"]
+                    )  # Append the firebase token to the user's FirebaseTokens list
+                    self.storage.put_user(
+                        user, self.durability_of("login")
+                    )  # Persist the updated user
+                    self.changed(
+                        "Users", "user", "put", {"UserID": user["UserID"]}, user
+                    )
             return json.dumps(
                 {
                     "status": "success",
@@ -239,10 +583,7 @@ class Catalog:
 
     def logout(self, userID, firebaseToken):
         """Log out a user by removing their firebase token."""
-        user = next(
-            (u for u in self.catalog_data["Users"] if u["UserID"] == userID),
-            None,
-        )  # Find the user by UserID in the Users list of the catalog data
+        user = self.users_by_id.get(userID)  # Find the user by UserID in the user index
         if not user:  # If the user does not exist, return an HTTP error
             raise cherrypy.HTTPError(404, "User not found")
         if (
@@ -251,7 +592,10 @@ class Catalog:
             user["FirebaseTokens"].remove(
                 firebaseToken
             )  # Remove the firebase token from the user's FirebaseTokens list
-        self.save_catalog()  # Save the updated catalog data to the JSON file
+        self.storage.put_user(
+            user, self.durability_of("logout")
+        )  # Persist the updated user
+        self.changed("Users", "user", "put", {"UserID": user["UserID"]}, user)
         return json.dumps(
             {
                 "status": "success",
@@ -261,42 +605,24 @@ class Catalog:
 
     def recover_password(self, body):
         """Send a password recovery email to the user with a secure code."""
-        user = next(
-            (u for u in self.catalog_data["Users"] if u["Email"] == body["email"]),
-            None,
-        )  # Find the user by email in the Users list of the catalog data
+        user = self.users_by_email.get(
+            body["email"]
+        )  # Find the user by email in the email index
         if user:  # If the user exists
-            secure_code = (
-                self.generate_secure_code()
-            )  # Generate a secure code for password recovery
-            api_key = os.getenv("MAILGUN_API_KEY")  # Read the API key from .env file
-            api_url = os.getenv("MAILGUN_API_URL")  # Read the API URL from .env file
-            from_address = os.getenv(
-                "FROM_EMAIL_ADDRESS"
-            )  # Read the sender email from .env file
-            response = requests.post(
-                api_url,
-                auth=("api", api_key),
-                data={
-                    "from": from_address,
-                    "to": user["Email"],
-                    "subject": "IoTail password recovery",
-                    "text": f"Dear user,\nuse this code to recover your password: {secure_code}",
-                },
-            )  # Send a POST request to the Mailgun API to send the password recovery email to the user
-            if response.status_code == 200:  # If the response is ok
-                self.codes.append(
-                    {"email": user["Email"], "code": secure_code}
-                )  # Save a dictionary with the email and code to the codes list to be used later for check
-                return json.dumps(
-                    {
-                        "status": "success",
-                        "message": "Password recovery email sent",
-                    }
-                )
-            raise cherrypy.HTTPError(
-                500, "Error sending recovery email"
-            )  # If the response is not ok, return an HTTP error
+            secure_code = self.issue_code(
+                "recover", user["Email"]
+            )  # Generate and save the code to be checked on reset
+            self.outbox.enqueue(
+                user["Email"],
+                "IoTail password recovery",
+                f"Dear user,\nuse this code to recover your password: {secure_code}",
+            )  # Queue the password recovery email
+            return json.dumps(
+                {
+                    "status": "success",
+                    "message": "Password recovery email sent",
+                }
+            )
         raise cherrypy.HTTPError(
             404, "User not found"
         )  # If the user does not exist, return an HTTP error
@@ -306,37 +632,32 @@ class Catalog:
         email = body["email"]
         recovery_code = body["recovery_code"]
         password = body["password"]
-
-        if not self.verify_code(
-            email, recovery_code
-        ):  # Check if the recovery code is valid or return an HTTP error
+        if not self.codes.peek(
+            "recover", email, recovery_code
+        ):  # Check the code first, wrong codes must not cost a bcrypt hash
+            raise cherrypy.HTTPError(401, "Invalid recovery code")
+        hashed_password = self.hasher.hash(
+            password
+        )  # Hash the password before using up the code, the pool may be saturated
+        if not self.codes.verify(
+            "recover", email, recovery_code
+        ):  # Used up by a concurrent reset meanwhile
             raise cherrypy.HTTPError(401, "Invalid recovery code")
-        user = next(
-            (u for u in self.catalog_data["Users"] if u["Email"] == email),
-            None,
-        )  # Find the user by email in the Users list of the catalog data
+        user = self.users_by_email.get(
+            email
+        )  # Find the user by email in the email index
         if user:  # If the user exists
-            user["Password"] = bcrypt.hashpw(
-                password.encode("utf-8"), bcrypt.gensalt()
-            ).decode(
-                "utf-8"
-            )  # Hash the new password using bcrypt
-            self.save_catalog()  # Save the updated catalog data to the JSON file
-            api_key = os.getenv("MAILGUN_API_KEY")  # Read the API key from .env file
-            api_url = os.getenv("MAILGUN_API_URL")  # Read the API URL from .env file
-            from_address = os.getenv(
-                "FROM_EMAIL_ADDRESS"
-            )  # Read the sender email from .env file
-            requests.post(
-                api_url,
-                auth=("api", api_key),
-                data={
-                    "from": from_address,
-                    "to": user["Email"],
-                    "subject": "IoTail password reset successful",
-                    "text": f"Dear user,\nyour password has been successfully reset",
-                },
-            )  # Send a confirmation email to the user using the Mailgun API
+            with self.writer:
+                user["Password"] = hashed_password  # Store the new bcrypt hash
+                self.storage.put_user(
+                    user, self.durability_of("reset_password")
+                )  # Persist the updated user
+                self.changed("Users", "user", "put", {"UserID": user["UserID"]}, user)
+            self.outbox.enqueue(
+                user["Email"],
+                "IoTail password reset successful",
+                f"Dear user,\nyour password has been successfully reset",
+            )  # Queue a confirmation email to the user
             return json.dumps(
                 {
                     "status": "success",
@@ -349,35 +670,34 @@ class Catalog:
 
     def edit_user(self, userID, body, file):
         """Edit user details and handle profile picture upload."""
-        user = next(
-            (u for u in self.catalog_data["Users"] if u["UserID"] == userID),
-            None,
-        )  # Find the user by UserID in the Users list of the catalog data
+        user = self.users_by_id.get(userID)  # Find the user by UserID in the user index
         if not user:  # If the user does not exist, return an HTTP error
             raise cherrypy.HTTPError(404, "User not found")
 
         # Update user details from the JSON body
+        if body["email"] != user["Email"]:  # If the email changes, move the email index
+            if (
+                body["email"] in self.users_by_email
+            ):  # Checked before changing anything, two users must not share an email
+                raise cherrypy.HTTPError(409, "Email already exists")
+            if self.users_by_email.get(user["Email"]) is user:
+                del self.users_by_email[user["Email"]]
+            self.users_by_email[body["email"]] = user
         user["Name"] = body["name"]
         user["Email"] = body["email"]
         user["PhoneNumber"] = body["phoneNumber"]
 
         # Handle profile picture file
         if file:  # If a file is provided, save it as the profile picture
-            profile_pictures_dir = "profile_pictures"
-            os.makedirs(
-                profile_pictures_dir, exist_ok=True
-            )  # Ensure the directory exists
-            file_path = os.path.join(
-                profile_pictures_dir, f"{userID}_profile.jpg"
-            )  # Create a file path for the profile picture
-            with open(file_path, "wb") as f:
-                shutil.copyfileobj(
-                    file, f
-                )  # Save the uploaded file to the specified path
-            user["ProfilePicture"] = file_path  # Save the relative path
+            user["ProfilePicture"] = self.replace_picture(
+                user["ProfilePicture"], file
+            )  # Save the content hash of the picture
 
         # Save updated catalog
-        self.save_catalog()
+        self.storage.put_user(
+            user, self.durability_of("edit_user")
+        )  # Persist the updated user
+        self.changed("Users", "user", "put", {"UserID": user["UserID"]}, user)
 
         return json.dumps(
             {
@@ -389,10 +709,7 @@ class Catalog:
     def add_dog(self, userID, body, picture):
         """Add a new dog to the user's list of dogs."""
         dogID = str(uuid.uuid4())  # Generate a unique dog ID using UUID
-        user = next(
-            (u for u in self.catalog_data["Users"] if u["UserID"] == userID),
-            None,
-        )  # Find the user by UserID in the Users list of the catalog data
+        user = self.users_by_id.get(userID)  # Find the user by UserID in the user index
         if not user:  # If the user does not exist, return an HTTP error
             raise cherrypy.HTTPError(404, "User not found")
         names = [
@@ -409,16 +726,9 @@ class Catalog:
         }  # Capitalize only first letter of the key without touching the others
         body["DogID"] = dogID  # Add the generated dog ID to the body
         if picture:  # If a picture is provided, save it as the dog's profile picture
-            dog_pictures_dir = "dog_pictures"
-            os.makedirs(dog_pictures_dir, exist_ok=True)  # Ensure the directory exists
-            file_path = os.path.join(
-                dog_pictures_dir, f"{userID}_{dogID}_dog.jpg"
-            )  # Create a file path for the dog's profile picture
-            with open(file_path, "wb") as f:
-                shutil.copyfileobj(
-                    picture, f
-                )  # Save the uploaded file to the specified path
-            body["Picture"] = file_path  # Save the relative path
+            body["Picture"] = self.replace_picture(
+                None, picture
+            )  # Save the content hash of the picture
         else:
             body["Picture"] = (
                 None  # If no picture is provided, set the Picture field to None
@@ -426,24 +736,24 @@ class Catalog:
         user["Dogs"].append(
             body
         )  # Append the new dog dictionary to the user's Dogs list in the catalog data
-        self.save_catalog()  # Save the updated catalog data to the JSON file
+        self.dogs_by_id[(userID, dogID)] = body  # Add the new dog to the dog index
+        self.storage.put_dog(
+            userID, body, self.durability_of("add_dog")
+        )  # Persist the updated dog
+        self.changed("Users", "dog", "put", {"UserID": userID, "DogID": dogID}, body)
         return json.dumps(
             {"status": "success", "message": f"Dog added to user {userID}"}
         )
 
     def edit_dog(self, userID, dogID, body, file):
         """Edit the details of a dog for a specific user."""
-        user = next(
-            (u for u in self.catalog_data["Users"] if u["UserID"] == userID),
-            None,
-        )  # Find the user by UserID in the Users list of the catalog data
+        user = self.users_by_id.get(userID)  # Find the user by UserID in the user index
         if not user:  # If the user does not exist, return an HTTP error
             raise cherrypy.HTTPError(404, "User not found")
 
-        dog = next(
-            (d for d in user["Dogs"] if d["DogID"] == dogID),
-            None,
-        )  # Find the dog by DogID in the user's Dogs list
+        dog = self.dogs_by_id.get(
+            (userID, dogID)
+        )  # Find the dog by UserID and DogID in the dog index
         if not dog:  # If the dog does not exist, return an HTTP error
             raise cherrypy.HTTPError(404, "Dog not found")
 
@@ -484,19 +794,15 @@ class Catalog:
 
         # Handle profile picture file
         if file:  # If a file is provided, save it as the dog's profile picture
-            dog_pictures_dir = "dog_pictures"
-            os.makedirs(dog_pictures_dir, exist_ok=True)  # Ensure the directory exists
-            file_path = os.path.join(
-                dog_pictures_dir, f"{userID}_{dogID}_dog.jpg"
-            )  # Create a file path for the dog's profile picture
-            with open(file_path, "wb") as f:
-                shutil.copyfileobj(
-                    file, f
-                )  # Save the uploaded file to the specified path
-            dog["Picture"] = file_path  # Save the relative path
+            dog["Picture"] = self.replace_picture(
+                dog["Picture"], file
+            )  # Save the content hash of the picture
 
         # Save updated catalog
-        self.save_catalog()
+        self.storage.put_dog(
+            userID, dog, self.durability_of("edit_dog")
+        )  # Persist the updated dog
+        self.changed("Users", "dog", "put", {"UserID": userID, "DogID": dogID}, dog)
 
         return json.dumps(
             {
@@ -507,23 +813,25 @@ class Catalog:
 
     def delete_dog(self, userID, dogID):
         """Delete a dog from a user's list of dogs."""
-        user = next(
-            user for user in self.catalog_data["Users"] if user["UserID"] == userID
-        )  # Find the user by UserID in the Users list of the catalog data
+        user = self.users_by_id.get(userID)  # Find the user by UserID in the user index
         if not user:  # If the user does not exist, return an HTTP error
             raise cherrypy.HTTPError(404, "User not found")
-        dog = next(
-            (d for d in user["Dogs"] if d["DogID"] == dogID),
-            None,
-        )  # Find the dog by DogID in the user's Dogs list
+        dog = self.dogs_by_id.get(
+            (userID, dogID)
+        )  # Find the dog by UserID and DogID in the dog index
         if not dog:  # If the dog does not exist, return an HTTP error
             raise cherrypy.HTTPError(404, "Dog not found")
-        if dog["Picture"]:  # If the dog has a picture, remove it from the filesystem
-            os.remove(dog["Picture"])
+        self.release_picture(
+            dog["Picture"]
+        )  # Remove the picture from the filesystem unless another record uses it
         user["Dogs"] = [
             d for d in user["Dogs"] if d["DogID"] != dogID
         ]  # Remove the dog from the user's Dogs list
-        self.save_catalog()  # Save the updated catalog data to the JSON file
+        del self.dogs_by_id[(userID, dogID)]  # Remove the dog from the dog index
+        self.storage.delete_dog(
+            userID, dogID, self.durability_of("delete_dog")
+        )  # Persist the deletion of the dog
+        self.changed("Users", "dog", "delete", {"UserID": userID, "DogID": dogID})
         return json.dumps(
             {"status": "success", "message": f"Dog {dogID} of User {userID} deleted"}
         )
@@ -533,21 +841,25 @@ class Catalog:
         storeID = body["storeID"]
         kennel = body["kennel"]
 
-        store = next(
-            (
-                store
-                for store in self.catalog_data["Stores"]
-                if store["StoreID"] == storeID
-            ),
-            None,
-        )  # Find the store by StoreID in the Stores list of the catalog data
+        store = self.stores_by_id.get(
+            storeID
+        )  # Find the store by StoreID in the store index
         if store:
-            kennel = next(
-                (k for k in store["Kennels"] if k["ID"] == kennel), None
-            )  # Find the kennel by ID in the store's Kennels list
+            kennel = self.kennels_by_id.get(
+                (storeID, kennel)
+            )  # Find the kennel by StoreID and kennel ID in the kennel index
             if kennel:  # If the kennel exists
                 kennel["Booked"] = True  # Set the kennel as booked
-                self.save_catalog()  # Save the updated catalog data to the JSON file
+                self.storage.put_kennel(
+                    storeID, kennel, self.durability_of("book")
+                )  # Persist the updated kennel
+                self.changed(
+                    "Stores",
+                    "kennel",
+                    "put",
+                    {"StoreID": storeID, "ID": kennel["ID"]},
+                    kennel,
+                )
                 return json.dumps({"status": "success", "message": "Kennel booked"})
             raise cherrypy.HTTPError(
                 404, "Kennel not found"
@@ -560,18 +872,25 @@ class Catalog:
         """Lock a kennel for a specific store."""
         storeID = body["storeID"]
         kennel = body["kennel"]
-        store = next(
-            (s for s in self.catalog_data["Stores"] if s["StoreID"] == storeID),
-            None,
-        )  # Find the store by StoreID in the Stores list of the catalog data
+        store = self.stores_by_id.get(
+            storeID
+        )  # Find the store by StoreID in the store index
         if store:  # If the store exists
-            kennel = next(
-                (k for k in store["Kennels"] if k["ID"] == kennel),
-                None,
-            )  # Find the kennel by ID in the store's Kennels list
+            kennel = self.kennels_by_id.get(
+                (storeID, kennel)
+            )  # Find the kennel by StoreID and kennel ID in the kennel index
             if kennel:  # If the kennel exists
                 kennel["Occupied"] = True  # Set the kennel as occupied
-                self.save_catalog()  # Save the updated catalog data to the JSON file
+                self.storage.put_kennel(
+                    storeID, kennel, self.durability_of("lock")
+                )  # Persist the updated kennel
+                self.changed(
+                    "Stores",
+                    "kennel",
+                    "put",
+                    {"StoreID": storeID, "ID": kennel["ID"]},
+                    kennel,
+                )
                 return json.dumps({"status": "success", "message": "Kennel locked"})
             raise cherrypy.HTTPError(
                 404, "Kennel not found"
@@ -584,19 +903,26 @@ class Catalog:
         """Free a kennel for a specific store."""
         storeID = body["storeID"]
         kennel = body["kennel"]
-        store = next(
-            (s for s in self.catalog_data["Stores"] if s["StoreID"] == storeID),
-            None,
-        )  # Find the store by StoreID in the Stores list of the catalog data
+        store = self.stores_by_id.get(
+            storeID
+        )  # Find the store by StoreID in the store index
         if store:  # If the store exists
-            kennel = next(
-                (k for k in store["Kennels"] if k["ID"] == kennel),
-                None,
-            )  # Find the kennel by ID in the store's Kennels list
+            kennel = self.kennels_by_id.get(
+                (storeID, kennel)
+            )  # Find the kennel by StoreID and kennel ID in the kennel index
             if kennel:  # If the kennel exists
                 kennel["Occupied"] = False  # Set the kennel as not occupied
                 kennel["Booked"] = False  # Set the kennel as not booked
-                self.save_catalog()  # Save the updated catalog data to the JSON file
+                self.storage.put_kennel(
+                    storeID, kennel, self.durability_of("free")
+                )  # Persist the updated kennel
+                self.changed(
+                    "Stores",
+                    "kennel",
+                    "put",
+                    {"StoreID": storeID, "ID": kennel["ID"]},
+                    kennel,
+                )
                 return json.dumps({"status": "success", "message": "Kennel freed"})
             raise cherrypy.HTTPError(
                 404, "Kennel not found"
@@ -612,93 +938,159 @@ class Catalog:
         if (
             not auth_header
         ):  # If the Authorization header is not present, return an HTTP error
-            # Allow access to status_page without token for simplicity, or add specific token check
+            # Allow access to the status views without token for simplicity, they are cached
             if not (
-                len(uri) > 0 and uri[0] == "status_page"
-            ):  # If the request is not for the status page, raise an HTTP error
+                len(uri) > 0 and uri[0] in ("status_page", "status.json")
+            ):  # If the request is not for the status views, raise an HTTP error, the event stream holds a thread so it needs a token
                 raise cherrypy.HTTPError(401, "Authorization token required")
         else:
-            token = auth_header.split(" ")[
-                1
-            ]  # Extract the token from the Authorization header
-            self.verify_token(token)  # Verify the token for other routes
+            self.tokens.authorize(
+                auth_header
+            )  # Parse the Bearer token and verify it, using the token cache
 
         if len(uri) == 0:  # If no URI is provided, return the entire catalog data
-            return json.dumps(self.catalog_data)
+            if "fields" in params:  # Only the requested top-level sections
+                return json.dumps(
+                    {
+                        field: self.catalog_section(field)
+                        for field in params["fields"].split(",")
+                        if field in self.catalog_data
+                    }
+                )
+            return self.cached_response(
+                "catalog",
+                tuple(
+                    self.responses.version(collection)
+                    for collection in ("Users", "Stores", "Devices", "Services")
+                )
+                + (self.liveness.version("sensor"), self.liveness.version("service")),
+                lambda: json.dumps(
+                    {field: self.catalog_section(field) for field in self.catalog_data}
+                ),
+            )
+        elif (
+            uri[0] == "changes"
+        ):  # If the URI is "changes", return the mutations after the "since" sequence number
+            try:
+                since = int(params.get("since", 0))
+            except ValueError:
+                raise cherrypy.HTTPError(400, "since must be an integer")
+            return json.dumps(
+                self.change_feed.since(since, params.get("boot"))
+            )  # A cursor from another boot must resync even if its sequence number exists
         elif uri[0] == "broker":  # If the URI is "broker", return the broker data
             return json.dumps(self.catalog_data["broker"])
+        elif (
+            uri[0] == "stores" and len(uri) > 1 and uri[1] == "nearby"
+        ):  # If the URI is "stores/nearby", return the closest stores with a free kennel
+            return self.nearby_stores(params)
+        elif (
+            uri[0] == "stores" and len(uri) > 1 and uri[1] == "summary"
+        ):  # If the URI is "stores/summary", return the kennel counters of the stores
+            summaries = self.snapshot("StoreSummaries")
+            if len(uri) > 2:  # If a specific storeID is provided, return that store
+                summary = summaries.find("StoreID", uri[2])
+                if not summary:  # If the store does not exist, return an HTTP error
+                    raise cherrypy.HTTPError(404, "Store not found")
+                return json.dumps(summary)
+            return self.cached_response(
+                "stores_summary",
+                (self.responses.version("Stores"),),
+                lambda: json.dumps(summaries.entries),
+            )
+        elif (
+            uri[0] in self.collection_routes and len(uri) == 1 and params
+        ):  # A collection route with fields, filter, limit or after parameters
+            return self.query_collection(uri[0], params)
         elif uri[0] == "devices":  # If the URI is "devices", return the devices data
-            return json.dumps(self.catalog_data["Devices"])
+            return self.cached_response(
+                "devices",
+                (self.responses.version("Devices"), self.liveness.version("sensor")),
+                lambda: json.dumps(self.live_devices()),
+            )
         elif uri[0] == "services":  # If the URI is "services", return the services data
-            return json.dumps(
-                self.catalog_data.get("Services", [])
+            return self.cached_response(
+                "services",
+                (self.responses.version("Services"), self.liveness.version("service")),
+                lambda: json.dumps(self.live_services()),
             )  # Modificato da serviceList a Services
         elif uri[0] == "stores":  # If the URI is "stores", return the stores data
-            return json.dumps(self.catalog_data["Stores"])
+            return self.cached_response(
+                "stores",
+                (self.responses.version("Stores"),),
+                lambda: json.dumps(self.snapshot("Stores").entries),
+            )
         elif uri[0] == "breeds":  # If the URI is "breeds", return the breeds data
-            return json.dumps(self.catalog_data["Breeds"])
+            return self.cached_response(
+                "breeds",
+                (self.responses.version("Breeds"),),
+                lambda: json.dumps(self.snapshot("Breeds").entries),
+            )
+        elif uri[0] == "dogs":  # If the URI is "dogs", return the dogs of every user
+            dogs = self.snapshot("Dogs")
+            if len(uri) > 1:  # If a specific dogID is provided, return that dog
+                dog = dogs.find("DogID", uri[1])
+                if not dog:  # If the dog does not exist, return an HTTP error
+                    raise cherrypy.HTTPError(404, "Dog not found")
+                return json.dumps(dog)
+            return self.cached_response(
+                "dogs",
+                (self.responses.version("Users"),),
+                lambda: json.dumps(dogs.entries),
+            )
         elif uri[0] == "users":  # If the URI is "users", return the users data
             if (
                 len(uri) > 1
             ):  # If a specific userID is provided, return that user's data
-                user = next(
-                    (u for u in self.catalog_data["Users"] if u["UserID"] == uri[1]),
-                    None,
-                )  # Find the user by UserID in the Users list of the catalog data
+                user = self.snapshot("Users").find(
+                    "UserID", uri[1]
+                )  # Find the user by UserID in the users snapshot
                 if not user:  # If the user does not exist, return an HTTP error
                     raise cherrypy.HTTPError(404, "User not found")
 
-                return json.dumps(
-                    {key: val for key, val in user.items() if key != "Password"}
-                )
-            return json.dumps(self.catalog_data["Users"])
+                return json.dumps(user)
+            return self.cached_response(
+                "users",
+                (self.responses.version("Users"),),
+                lambda: json.dumps(self.snapshot("Users").entries),
+            )
         elif (
             uri[0] == "profile_picture"
         ):  # If the URI is "profile_picture", return the user's profile picture
             if len(uri) < 2:  # If no userID is provided, raise an HTTP error
                 raise cherrypy.HTTPError(400, "Bad request, add userID")
-            user = next(
-                (u for u in self.catalog_data["Users"] if u["UserID"] == uri[1]),
-                None,
-            )  # Find the user by UserID in the Users list of the catalog data
+            user = self.snapshot("Users").find(
+                "UserID", uri[1]
+            )  # Find the user by UserID in the users snapshot
             if not user:  # If the user does not exist, return an HTTP error
                 raise cherrypy.HTTPError(404, "User not found")
             if not user[
                 "ProfilePicture"
             ]:  # If the user does not have a profile picture, return None
                 return None
-            return static.serve_file(
-                "/app/" + user["ProfilePicture"],
-                content_type="image/jpg",
-                disposition="attachment",
-                name=user["ProfilePicture"].split("/")[-1],
+            return self.serve_picture(
+                user["ProfilePicture"], params.get("size", "full")
             )  # Serve the profile picture file
         elif (
             uri[0] == "dog_picture"
         ):  # If the URI is "dog_picture", return the dog's profile picture
             if len(uri) < 3:  # If no userID or dogID is provided, raise an HTTP error
                 raise cherrypy.HTTPError(400, "Bad request, use userID and dogID")
-            user = next(
-                (u for u in self.catalog_data["Users"] if u["UserID"] == uri[1]),
-                None,
-            )  # Find the user by UserID in the Users list of the catalog data
-            if not user:  # If the user does not exist, return an HTTP error
+            if not self.snapshot("Users").find(
+                "UserID", uri[1]
+            ):  # If the user does not exist, return an HTTP error
                 raise cherrypy.HTTPError(404, "User not found")
-            dog = next(
-                (d for d in user["Dogs"] if d["DogID"] == uri[2]),
-                None,
-            )  # Find the dog by DogID in the user's Dogs list
-            if not dog:  # If the dog does not exist, return an HTTP error
+            dog = self.snapshot("Dogs").find(
+                "DogID", uri[2]
+            )  # Find the dog by DogID in the dogs snapshot
+            if not dog or dog["UserID"] != uri[1]:  # The dog must belong to the user
                 raise cherrypy.HTTPError(404, "Dog not found")
             if not dog[
                 "Picture"
             ]:  # If the dog does not have a profile picture, return None
                 return None
-            return static.serve_file(
-                "/app/" + dog["Picture"],
-                content_type="image/jpg",
-                disposition="attachment",
-                name=dog["Picture"].split("/")[-1],
+            return self.serve_picture(
+                dog["Picture"], params.get("size", "full")
             )  # Serve the dog's profile picture file
         elif (
             uri[0] == "status_page"
@@ -706,89 +1098,37 @@ class Catalog:
             cherrypy.response.headers["Content-Type"] = (
                 "text/html"  # Set the response content type to HTML
             )
-            html = """
-            <html>
-            <head>
-                <title>Status Page</title>
-                <style>
-                    .status-circle {
-                        height: 15px;
-                        width: 15px;
-                        border-radius: 50%;
-                        display: inline-block;
-                        margin-right: 10px;
-                    }
-                    .green { background-color: green; }
-                    .red { background-color: red; }
-                    body { font-family: Arial, sans-serif; margin: 20px; }
-                    h1 { color: #333; }
-                    h2 { color: #555; border-bottom: 1px solid #eee; padding-bottom: 5px;}
-                    ul { list-style-type: none; padding-left: 0; }
-                    li { margin-bottom: 8px; padding: 5px; border: 1px solid #ddd; border-radius: 4px; background-color: #f9f9f9; display: flex; align-items: center;}
-                    .details { margin-left: 10px; }
-                </style>
-
-            </head>
-            <body>
-                <h1>System Status</h1>
-            """  # Start the HTML document with a title and styles
-
-            html += "<h2>Devices</h2><ul>"  # Add a section for devices
-            if (
-                "Devices" in self.catalog_data and self.catalog_data["Devices"]
-            ):  # Check if Devices key exists and has items
-                for device in self.catalog_data[
-                    "Devices"
-                ]:  # Iterate through each device in the Devices list
-                    device_id = device.get("DeviceID", "N/A")
-                    device_name = device.get("Name", f"DefaultNameForID_{device_id}")
-                    available_status = device.get("Available", False)
-
-                    status_color = (
-                        "green" if available_status else "red"
-                    )  # Determine the status color based on availability
-                    html += f"""<li>
-                                    <span class='status-circle {status_color}'></span>
-                                    <div class='details'>
-                                        ID: {device_id}, Name: {device_name}
-                                    </div>
-                                </li>"""  # Create a list item for each device with its status
-            else:
-                html += "<li>No devices registered.</li>"  # If no devices are registered, display a message
-            html += "</ul>"  # Close the devices section
-
-            html += "<h2>Services</h2><ul>"  # Add a section for services
-            service_list_items = self.catalog_data.get(
-                "Services", []
-            )  # Get the list of services from the catalog data
-            if service_list_items:  # Check if there are any services registered
-                for service in service_list_items:
-                    service_id = service.get("ServiceID", "N/A")
-                    service_name = service.get("Name", f"DefaultNameForID_{service_id}")
-                    available_status = service.get("Available", False)
-
-                    status_color = "green" if available_status else "red"
-                    html += f"""<li>
-                                    <span class='status-circle {status_color}'></span>
-                                    <div class='details'>
-                                        ID: {service_id}, Name: {service_name}
-                                    </div>
-                                </li>"""  # Create a list item for each service with its status
-            else:
-                html += "<li>No services registered.</li>"  # If no services are registered, display a message
-            html += "</ul>"  # Close the services section
-
-            html += """
-            </body>
-            </html>
-            """  # Close the HTML document
-            return html
+            return self.cached_response(
+                "status_page",
+                self.status_version(),
+                lambda: render_page(self.live_devices(), self.live_services()),
+            )  # Rendered again only when availability or the registrations change
+        elif (
+            uri[0] == "status.json"
+        ):  # If the URI is "status.json", return the availability of every device and service
+            return self.cached_response(
+                "status_json",
+                self.status_version(),
+                lambda: render_json(self.live_devices(), self.live_services()),
+            )
+        elif (
+            len(uri) > 1 and uri[0] == "status" and uri[1] == "events"
+        ):  # If the URI is "status/events", stream availability transitions as Server-Sent Events
+            return self.status_events.stream(
+                render_json(self.live_devices(), self.live_services())
+            )
         else:
             raise cherrypy.HTTPError(
                 404, "Resource not found"
             )  # If the URI does not match any known routes, return a 404 error
 
     def POST(self, *uri, **params):
+        if uri and uri[0] in self.lock_free_routes.get("POST", ()):
+            return self.handle_post(*uri, **params)
+        with self.writer:  # One mutation at a time, readers use snapshots
+            return self.handle_post(*uri, **params)
+
+    def handle_post(self, *uri, **params):
         # Routes that do not require authentication
         public_routes = ["register", "login", "recover", "confirm_registration"]
 
@@ -802,10 +1142,9 @@ class Catalog:
                 not auth_header
             ):  # If the Authorization header is not present, raise an HTTP error
                 raise cherrypy.HTTPError(401, "Authorization token required")
-            token = auth_header.split(" ")[
-                1
-            ]  # Extract the token from the Authorization header
-            self.verify_token(token)  # Verify the token
+            self.tokens.authorize(
+                auth_header
+            )  # Parse the Bearer token and verify it, using the token cache
 
         if cherrypy.request.headers.get("Content-Type", "").startswith(
             "application/json"
@@ -868,70 +1207,79 @@ class Catalog:
             self.catalog_data["Devices"].append(
                 json_body
             )  # Append the new device dictionary to the Devices list in the catalog data
-            self.save_catalog()  # Save the updated catalog data to the JSON file
+            self.index_device(json_body)  # Add the new device to the device index
+            self.storage.put_device(
+                json_body, self.durability_of("devices")
+            )  # Persist the updated device
+            self.changed(
+                "Devices",
+                "device",
+                "put",
+                {"DeviceID": json_body["DeviceID"]},
+                json_body,
+            )
             return json.dumps({"status": "success", "message": "Device added"})
         elif uri[0] == "services":
             self.catalog_data["Services"].append(
                 json_body
             )  # Append the new service dictionary to the Services list in the catalog data
-            self.save_catalog()  # Save the updated catalog data to the JSON file
+            self.index_service(json_body)  # Add the new service to the service index
+            self.storage.put_service(
+                json_body, self.durability_of("services")
+            )  # Persist the updated service
+            self.changed(
+                "Services",
+                "service",
+                "put",
+                {"ServiceID": json_body["ServiceID"]},
+                json_body,
+            )
             return json.dumps({"status": "success", "message": "Service added"})
+        elif (
+            uri[0] == "heartbeat" and len(uri) > 1 and uri[1] == "batch"
+        ):  # If the URI is "heartbeat/batch", handle the heartbeats of a gateway
+            if not isinstance(json_body, list):
+                raise cherrypy.HTTPError(400, "A list of heartbeats is required")
+            received, unknown, invalid = 0, [], []
+            for beat in json_body:  # Reported back instead of failing the whole batch
+                error = self.heartbeat_error(beat)
+                if error:
+                    invalid.append({"Heartbeat": beat, "Error": error})
+                elif self.record_heartbeat(beat):
+                    received += 1
+                else:
+                    unknown.append(beat)
+            return json.dumps(
+                {
+                    "status": "success",
+                    "Received": received,
+                    "Unknown": unknown,
+                    "Invalid": invalid,
+                }
+            )
         elif (
             uri[0] == "heartbeat"
         ):  # If the URI is "heartbeat", handle the heartbeat request
-            # Handle heartbeat
-            category = json_body.get("category", None)
-            if not category:  # If the category is not provided, raise an HTTP error
-                raise cherrypy.HTTPError(400, "Category is required")
-            if (
-                category == "sensor"
-            ):  # If the category is "sensor", handle sensor heartbeat
-                device_id = json_body["deviceID"]
-                device = next(
-                    (
-                        d
-                        for d in self.catalog_data["Devices"]
-                        if d["DeviceID"] == device_id
-                    ),
-                    None,
-                )  # Find the device by DeviceID in the Devices list of the catalog data
-                if not device:  # If the device does not exist, raise an HTTP error
+            if not self.record_heartbeat(
+                json_body
+            ):  # If the device or service does not exist, raise an HTTP error
+                if json_body["category"] == "sensor":
                     raise cherrypy.HTTPError(404, "Device not found")
-                device["LastAvailable"] = (
-                    time.time()
-                )  # Update the LastAvailable timestamp of the device
-                device["Available"] = True  # Set the device as available
-            elif (
-                category == "service"
-            ):  # If the category is "service", handle service heartbeat
-                service_id = json_body.get("serviceID")
-                service = next(
-                    (
-                        s
-                        for s in self.catalog_data.get(
-                            "Services", []  # Modificato da serviceList a Services
-                        )
-                        if s.get("ServiceID") == service_id
-                    ),
-                    None,
-                )  # Find the service by ServiceID in the Services list of the catalog data
-                if not service:  # If the service does not exist, raise an HTTP error
-                    raise cherrypy.HTTPError(
-                        404,
-                        f"Service with ID {service_id} not found in Services",  # Messaggio aggiornato
-                    )
-                service["LastAvailable"] = (
-                    time.time()
-                )  # Update the LastAvailable timestamp of the service
-                service["Available"] = True  # Set the service as available
-            else:  # If the category is not recognized, raise an HTTP error
-                raise cherrypy.HTTPError(400, "Invalid category")
-            self.save_catalog()  # Save the updated catalog data to the JSON file
+                raise cherrypy.HTTPError(
+                    404,
+                    f"Service with ID {json_body.get('serviceID')} not found in Services",
+                )
             return json.dumps({"status": "success", "message": "Heartbeat received"})
         else:  # If the URI does not match any known routes, raise an HTTP error
             raise cherrypy.HTTPError(400, "Bad request")
 
     def PUT(self, *uri, **params):
+        if uri and uri[0] in self.lock_free_routes.get("PUT", ()):
+            return self.handle_put(*uri, **params)
+        with self.writer:  # One mutation at a time, readers use snapshots
+            return self.handle_put(*uri, **params)
+
+    def handle_put(self, *uri, **params):
         # Routes that do not require authentication
         public_routes = ["reset_password"]
 
@@ -945,10 +1293,9 @@ class Catalog:
                 not auth_header
             ):  # If the Authorization header is not present, raise an HTTP error
                 raise cherrypy.HTTPError(401, "Authorization token required")
-            token = auth_header.split(" ")[
-                1
-            ]  # Extract the token from the Authorization header
-            self.verify_token(token)  # Verify the token
+            self.tokens.authorize(
+                auth_header
+            )  # Parse the Bearer token and verify it, using the token cache
 
         if cherrypy.request.headers.get("Content-Type", "").startswith(
             "application/json"
@@ -956,6 +1303,10 @@ class Catalog:
             body = cherrypy.request.body.read()
             json_body = json.loads(body)
 
+        if uri[0] == "devices" and isinstance(
+            json_body, list
+        ):  # A list of devices is registered by a gateway, creating the missing ones
+            return self.upsert_devices(json_body)
         if uri[0] == "devices":  # If the URI is "devices", update a device
             # Modificato per usare "Devices" invece di "deviceList"
             device_id_to_update = json_body.get(
@@ -968,19 +1319,21 @@ class Catalog:
                     400, "DeviceID is required in request body for update"
                 )
 
-            devices = self.catalog_data.get("Devices", [])
-            found = False
-            for i, device in enumerate(devices):
-                if device.get("DeviceID") == device_id_to_update:
-                    self.catalog_data["Devices"][
-                        i
-                    ] = json_body  # Update the device in the Devices list
-                    found = True
-                    break
-            if not found:  # If the device is not found, raise an HTTP error
+            device = self.devices_by_id.get(
+                device_id_to_update
+            )  # Find the device by DeviceID in the device index
+            if not device:  # If the device is not found, raise an HTTP error
                 raise cherrypy.HTTPError(
                     404, f"Device with ID {device_id_to_update} not found"
                 )
+            device.clear()  # Update the device in place, keeping its position in the Devices list
+            device.update(json_body)
+            self.storage.put_device(
+                device, self.durability_of("devices")
+            )  # Persist the updated device
+            self.changed(
+                "Devices", "device", "put", {"DeviceID": device["DeviceID"]}, device
+            )
 
         elif uri[0] == "services":  # If the URI is "services", update a service
             service_id_to_update = json_body.get("serviceID")
@@ -991,21 +1344,36 @@ class Catalog:
                     400, "serviceID is required in request body for update"
                 )
 
-            services = self.catalog_data.get(
-                "Services", []
-            )  # Get the list of services from the catalog data
-            found = False
-            for i, service in enumerate(services):
-                if service.get("ServiceID") == service_id_to_update:
-                    self.catalog_data["Services"][
-                        i
-                    ] = json_body  # Update the service in the Services list
-                    found = True
-                    break
-            if not found:  # If the service is not found, raise an HTTP error
+            service = self.services_by_id.get(
+                service_id_to_update
+            )  # Find the service by ServiceID in the service index
+            if not service:  # If the service is not found, raise an HTTP error
                 raise cherrypy.HTTPError(
                     404, f"Service with ID {service_id_to_update} not found"
                 )
+            service.clear()  # Update the service in place, keeping its position in the Services list
+            service.update(json_body)
+            if (
+                service.get("ServiceID") != service_id_to_update
+            ):  # If the new body does not carry the same ServiceID, move the index entry
+                del self.services_by_id[service_id_to_update]
+                self.index_service(service)
+                self.storage.delete_service(
+                    service_id_to_update, self.durability_of("services")
+                )  # Remove the row stored under the old ServiceID
+                self.changed(
+                    "Services", "service", "delete", {"ServiceID": service_id_to_update}
+                )
+            self.storage.put_service(
+                service, self.durability_of("services")
+            )  # Persist the updated service
+            self.changed(
+                "Services",
+                "service",
+                "put",
+                {"ServiceID": service["ServiceID"]},
+                service,
+            )
         elif uri[0] == "users":  # If the URI is "users", update a user
             if len(uri) < 2:  # If no userID is provided, raise an HTTP error
                 raise cherrypy.HTTPError(400, "UserID is required")
@@ -1094,10 +1462,15 @@ class Catalog:
         else:  # If the URI does not match any known routes, raise an HTTP error
             raise cherrypy.HTTPError(400, "Bad request")
 
-        self.save_catalog()  # Save the updated catalog data to the JSON file
         return "200 OK"
 
     def DELETE(self, *uri, **params):
+        if uri and uri[0] in self.lock_free_routes.get("DELETE", ()):
+            return self.handle_delete(*uri, **params)
+        with self.writer:  # One mutation at a time, readers use snapshots
+            return self.handle_delete(*uri, **params)
+
+    def handle_delete(self, *uri, **params):
         if (
             uri[0] == "dogs"
         ):  # If the URI is "dogs", delete a dog from a user's list of dogs
@@ -1112,21 +1485,30 @@ class Catalog:
             if len(uri) < 2:  # If no userID is provided, raise an HTTP error
                 raise cherrypy.HTTPError(400, "Bad request, use userID")
             user_id = uri[1]
-            user = next(
-                user for user in self.catalog_data["Users"] if user["UserID"] == user_id
-            )  # Find the user by UserID in the Users list of the catalog data
+            user = self.users_by_id.get(
+                user_id
+            )  # Find the user by UserID in the user index
             if not user:
                 raise cherrypy.HTTPError(
                     404, "User not found"
                 )  # If the user does not exist, raise an HTTP error
-            if user[
-                "ProfilePicture"
-            ]:  # If the user has a profile picture, remove it from the filesystem
-                os.remove(user["ProfilePicture"])
+            self.release_picture(
+                user["ProfilePicture"]
+            )  # Remove the pictures from the filesystem unless another record uses them
+            for dog in user["Dogs"]:
+                self.release_picture(dog["Picture"])
             self.catalog_data["Users"] = [
                 u for u in self.catalog_data["Users"] if u["UserID"] != user_id
             ]  # Remove the user from the Users list
-            self.save_catalog()  # Save the updated catalog data to the JSON file
+            self.unindex_user(user)  # Remove the user and their dogs from the indexes
+            self.storage.delete_user(
+                user_id, self.durability_of("delete_user")
+            )  # Persist the deletion of the user
+            self.changed("Users", "user", "delete", {"UserID": user_id})
+            for dog in user["Dogs"]:  # The user's dogs are gone with them
+                self.changed(
+                    "Users", "dog", "delete", {"UserID": user_id, "DogID": dog["DogID"]}
+                )
             return json.dumps(
                 {"status": "success", "message": f"User {uri[1]} deleted"}
             )
@@ -1137,16 +1519,18 @@ class Catalog:
             if len(uri) < 2:  # If no userID is provided, raise an HTTP error
                 raise cherrypy.HTTPError(400, "Bad request, use userID")
             user_id = uri[1]
-            user = next(
-                user for user in self.catalog_data["Users"] if user["UserID"] == user_id
-            )  # Find the user by UserID in the Users list of the catalog data
+            user = self.users_by_id.get(
+                user_id
+            )  # Find the user by UserID in the user index
             if user:  # If the user exists
-                if user[
-                    "ProfilePicture"
-                ]:  # If the user has a profile picture, remove it from the filesystem
-                    os.remove(user["ProfilePicture"])
+                self.release_picture(
+                    user["ProfilePicture"]
+                )  # Remove the picture from the filesystem unless another record uses it
                 user["ProfilePicture"] = None  # Set the user's profile picture to None
-                self.save_catalog()  # Save the updated catalog data to the JSON file
+                self.storage.put_user(
+                    user, self.durability_of("profile_picture")
+                )  # Persist the updated user
+                self.changed("Users", "user", "put", {"UserID": user["UserID"]}, user)
                 return json.dumps(
                     {"status": "success", "message": "Profile picture deleted"}
                 )
@@ -1159,20 +1543,24 @@ class Catalog:
                 raise cherrypy.HTTPError(400, "Bad request, use userID and dogID")
             user_id = uri[1]
             dog_id = uri[2]
-            user = next(
-                user for user in self.catalog_data["Users"] if user["UserID"] == user_id
-            )  # Find the user by UserID in the Users list of the catalog data
+            user = self.users_by_id.get(
+                user_id
+            )  # Find the user by UserID in the user index
             if user:  # If the user exists
-                dog = next(
-                    dog for dog in user["Dogs"] if dog["DogID"] == dog_id
-                )  # Find the dog by DogID in the user's Dogs list
+                dog = self.dogs_by_id.get(
+                    (user_id, dog_id)
+                )  # Find the dog by UserID and DogID in the dog index
                 if dog:  # If the dog exists
-                    if dog[
-                        "Picture"
-                    ]:  # If the dog has a profile picture, remove it from the filesystem
-                        os.remove(dog["Picture"])
+                    self.release_picture(
+                        dog["Picture"]
+                    )  # Remove the picture from the filesystem unless another record uses it
                     dog["Picture"] = None  # Set the dog's profile picture to None
-                    self.save_catalog()  # Save the updated catalog data to the JSON file
+                    self.storage.put_dog(
+                        user_id, dog, self.durability_of("dog_picture")
+                    )  # Persist the updated dog
+                    self.changed(
+                        "Users", "dog", "put", {"UserID": user_id, "DogID": dog_id}, dog
+                    )
                     return json.dumps(
                         {"status": "success", "message": "Dog rofile picture deleted"}
                     )
@@ -1185,16 +1573,36 @@ class Catalog:
         elif (
             uri[0] == "devices" and len(uri) > 1
         ):  # If the URI is "devices" and a deviceID is provided, delete a device
-            device_id_to_delete = uri[1]
+            device = self.find_indexed(
+                self.devices_by_id, uri[1]
+            )  # The URI carries the ID as text, the catalog may store an integer
+            if device is None:
+                raise cherrypy.HTTPError(404, "Device not found")
+            device_id_to_delete = device["DeviceID"]
             self.catalog_data["Devices"] = [
                 d
                 for d in self.catalog_data.get("Devices", [])
                 if d.get("DeviceID") != device_id_to_delete
             ]  # Remove the device with the specified DeviceID from the Devices list
+            self.devices_by_id.pop(
+                device_id_to_delete, None
+            )  # Remove the device from the device index
+            self.liveness.forget("sensor", device_id_to_delete)
+            self.storage.delete_device(
+                device_id_to_delete, self.durability_of("devices")
+            )  # Persist the deletion
+            self.changed(
+                "Devices", "device", "delete", {"DeviceID": device_id_to_delete}
+            )
         elif (
             uri[0] == "services" and len(uri) > 1
         ):  # If the URI is "services" and a serviceID is provided, delete a service
-            service_id_to_delete = uri[1]
+            service = self.find_indexed(
+                self.services_by_id, uri[1]
+            )  # The URI carries the ID as text, the catalog may store an integer
+            if service is None:
+                raise cherrypy.HTTPError(404, "Service not found")
+            service_id_to_delete = service["ServiceID"]
             self.catalog_data["Services"] = [  # Modificato da serviceList a Services
                 s
                 for s in self.catalog_data.get(
@@ -1202,34 +1610,530 @@ class Catalog:
                 )  # Modificato da serviceList a Services
                 if s.get("ServiceID") != service_id_to_delete
             ]  # Remove the service with the specified ServiceID from the Services list
+            self.services_by_id.pop(
+                service_id_to_delete, None
+            )  # Remove the service from the service index
+            self.liveness.forget("service", service_id_to_delete)
+            self.storage.delete_service(
+                service_id_to_delete, self.durability_of("services")
+            )  # Persist the deletion
+            self.changed(
+                "Services", "service", "delete", {"ServiceID": service_id_to_delete}
+            )
         else:  # If the URI does not match any known routes, raise an HTTP error
             raise cherrypy.HTTPError(400, "Bad request")
 
-        self.save_catalog()  # Save the updated catalog data to the JSON file
         return "200 OK"
 
-    def check_availability(self):
+    def changed(self, collection, entity, op, key, value=None):
+        """Invalidate the cached responses of a collection and log the change for GET /changes."""
+        version = self.responses.version(collection)
+        self.responses.bump(collection)
+        if entity == "kennel":  # Keep the kennel counters current
+            self.count_kennel(key["StoreID"], value)
+        elif entity == "dog":  # Keep the resolved dogs current for GET /dogs
+            if op == "delete":
+                self.resolved_dogs.pop(key["DogID"], None)
+            else:
+                self.resolved_dogs[key["DogID"]] = self.resolve_dog(
+                    key["UserID"], value
+                )
+        self.carry_snapshots(collection, entity, key, version)
+        if entity == "user" and value is not None:
+            value = {
+                field: v
+                for field, v in value.items()
+                if field not in ("Password", "Dogs")
+            }  # Never publish password hashes, dogs are logged as their own entities
+        elif entity == "kennel" and value is not None:
+            value = {
+                field: v for field, v in value.items() if field != "UnlockCode"
+            }  # Never publish the unlock code
+        self.change_feed.record(collection, entity, op, key, value)
+        self.publish_change(entity, op, key, value)
+
+    @staticmethod
+    def heartbeat_error(beat):
+        """Return why a heartbeat body is malformed, or None if it is well formed."""
+        if not isinstance(beat, dict) or not beat.get("category"):
+            return "Category is required"
+        if beat["category"] not in ("sensor", "service"):
+            return "Invalid category"
+        return None
+
+    def record_heartbeat(self, beat):
+        """Record the heartbeat of a device or service in memory, returning False if it is not in the catalog."""
+        error = self.heartbeat_error(beat)
+        if error:  # If the body is malformed, raise an HTTP error
+            raise cherrypy.HTTPError(400, error)
+        if beat["category"] == "sensor":
+            entity_id, index = beat.get("deviceID"), self.devices_by_id
+        else:
+            entity_id, index = beat.get("serviceID"), self.services_by_id
+        if not isinstance(entity_id, (int, str)) or entity_id not in index:
+            return False
+        self.liveness.beat(beat["category"], entity_id)
+        return True
+
+    def entity_topic(self, entity, key):
+        """Return the retained MQTT topic of a kennel, dog, device or service."""
+        if entity == "kennel":
+            return f"{self.base_topic}/stores/{key['StoreID']}/kennels/{key['ID']}"
+        elif entity == "dog":
+            return f"{self.base_topic}/users/{key['UserID']}/dogs/{key['DogID']}"
+        elif entity == "device":
+            return f"{self.base_topic}/devices/{key['DeviceID']}"
+        elif entity == "service":
+            return f"{self.base_topic}/services/{key['ServiceID']}"
+        return None  # Users are not published, they carry personal data
+
+    def publish_change(self, entity, op, key, value=None):
+        """Publish the new state of an entity as a retained message, or clear it once deleted."""
+        topic = self.entity_topic(entity, key)
+        if topic is None:
+            return
+        if op == "delete":
+            self.client.clear_retained(topic)
+        elif entity == "kennel":
+            self.client.publish(
+                topic,
+                {
+                    "Size": value["Size"],
+                    "Booked": value["Booked"],
+                    "Occupied": value["Occupied"],
+                },  # Never publish the unlock code
+                1,
+                retain=True,
+            )
+        elif entity == "dog":
+            self.client.publish(
+                topic, self.resolved_dogs[key["DogID"]], 1, retain=True
+            )  # Dogs are published with their effective thresholds
+        # Device and service availability is published by publish_liveness
+
+    def notify(self, topic, payload):
+        """Record a heartbeat, or a Last Will, received on IoTail/heartbeat/<category>/<ID>."""
+        category, _, raw_id = topic[len(self.heartbeat_topic) + 1 :].partition("/")
+        if category == "sensor":
+            index = self.devices_by_id
+        elif category == "service":
+            index = self.services_by_id
+        else:
+            return
+        entity_id = raw_id  # Topics carry IDs as text, the catalog may store integers
+        if entity_id not in index and raw_id.lstrip("-").isdigit():
+            entity_id = int(raw_id)
+        if entity_id not in index or not payload:  # Unknown entity or cleared message
+            return
+        try:
+            available = json.loads(payload).get("Available", True)
+        except (ValueError, AttributeError):
+            return
+        if available:
+            self.liveness.beat(category, entity_id)  # Recorded in memory only
+        else:
+            self.liveness.expire(
+                category, entity_id
+            )  # Disconnected, shown as unavailable at once
+
+    def publish_liveness(self, category, entity_id, available):
+        """Publish a device or service availability transition as a retained message."""
+        if category == "sensor":
+            topic = self.entity_topic("device", {"DeviceID": entity_id})
+        else:
+            topic = self.entity_topic("service", {"ServiceID": entity_id})
+        self.client.publish(
+            topic,
+            {
+                "Available": available,
+                "LastAvailable": self.liveness.last_seen(category, entity_id),
+            },
+            1,
+            retain=True,
+        )
+
+    def publish_state(self):
+        """Publish the current state of every kennel, dog, device and service."""
+        for store in self.catalog_data["Stores"]:
+            for kennel in store["Kennels"]:
+                self.publish_change(
+                    "kennel",
+                    "put",
+                    {"StoreID": store["StoreID"], "ID": kennel["ID"]},
+                    kennel,
+                )
+        for user in self.catalog_data["Users"]:
+            for dog in user["Dogs"]:
+                self.publish_change(
+                    "dog", "put", {"UserID": user["UserID"], "DogID": dog["DogID"]}, dog
+                )
+        for device in self.catalog_data["Devices"]:
+            self.publish_liveness(
+                "sensor",
+                device["DeviceID"],
+                self.liveness.is_available("sensor", device["DeviceID"]),
+            )
+        for service in self.catalog_data.get("Services", []):
+            self.publish_liveness(
+                "service",
+                service["ServiceID"],
+                self.liveness.is_available("service", service["ServiceID"]),
+            )
+
+    def public_user(self, user):
+        """Return a user without the password hash."""
+        return {key: val for key, val in user.items() if key != "Password"}
+
+    def catalog_section(self, field):
+        """Return a top-level section of the catalog as served to clients."""
+        if field == "Devices":
+            return self.live_devices()
+        elif field == "Services":
+            return self.live_services()
+        elif field in ("Users", "Stores", "Breeds"):
+            return self.snapshot(field).entries
+        return self.catalog_data[field]  # Sections like "broker" never change
+
+    def query_collection(self, route, params):
+        """Serve a collection route restricted by the fields, filter, limit and after parameters."""
+        collection, id_field, indexes = self.collection_routes[route]
+        snapshot = self.snapshot(collection)
+        entries = snapshot.entries
+
+        if "filter" in params:  # Filters look like "StoreID:0,Name:Turin"
+            conditions = []
+            for condition in params["filter"].split(","):
+                field, _, value = condition.partition(":")
+                if field not in indexes:
+                    raise cherrypy.HTTPError(
+                        400,
+                        f"Filtering is only supported on {', '.join(indexes)}",
+                    )
+                conditions.append((field, value))
+            field, value = conditions[0]
+            entry = snapshot.find(field, value)
+            entries = (
+                [entry]
+                if entry is not None
+                and all(str(entry.get(f)) == v for f, v in conditions[1:])
+                else []
+            )  # Indexed fields are unique, so the first condition selects at most one entry
+
+        start = 0
+        if "after" in params:  # Cursor: the ID of the last entry of the previous page
+            start = self.position_of(snapshot, id_field, params["after"], entries)
+        try:
+            limit = int(params["limit"]) if "limit" in params else None
+        except ValueError:
+            raise cherrypy.HTTPError(400, "limit must be an integer")
+        if limit is not None and limit < 1:
+            raise cherrypy.HTTPError(400, "limit must be positive")
+        end = len(entries) if limit is None else start + limit
+        page = entries[start:end]
+
+        if route == "devices":  # Overlay liveness on the selected entries only
+            page = self.liveness.merge("sensor", page, "DeviceID")
+        elif route == "services":
+            page = self.liveness.merge("service", page, "ServiceID")
+        if "fields" in params:
+            fields = [
+                field for field in params["fields"].split(",") if field != "Password"
+            ]  # Password hashes are never served
+            items = [
+                {field: entry[field] for field in fields if field in entry}
+                for entry in page
+            ]
+        else:
+            items = page  # The users snapshot holds no password hashes
+
+        if limit is None:
+            return json.dumps(items)
+        return json.dumps(
+            {
+                "Items": items,
+                "Next": (
+                    str(page[-1][id_field]) if page and end < len(entries) else None
+                ),  # Pass as "after" to get the next page, None on the last one
+            }
+        )
+
+    def nearby_stores(self, params):
+        """Return the k nearest stores within a radius that have a free kennel for a dog size."""
+        try:
+            lat = float(params["lat"])
+            lon = float(params["lon"])
+            radius = float(params.get("radius", 25))  # Kilometres
+            limit = int(params.get("limit", 5))
+        except KeyError:
+            raise cherrypy.HTTPError(400, "lat and lon are required")
+        except ValueError:
+            raise cherrypy.HTTPError(400, "lat, lon, radius and limit must be numbers")
+        if not all(math.isfinite(value) for value in (lat, lon, radius)):
+            raise cherrypy.HTTPError(400, "lat, lon and radius must be finite")
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise cherrypy.HTTPError(400, "lat or lon out of range")
+        if limit < 1 or radius <= 0:
+            raise cherrypy.HTTPError(400, "limit and radius must be positive")
+        limit = min(limit, self.max_nearby_stores)
+        radius = min(radius, self.max_nearby_radius_km)
+        size = params.get("size", self.kennel_sizes[0])
+        if size not in self.kennel_sizes:
+            raise cherrypy.HTTPError(
+                400, f"size must be one of {', '.join(self.kennel_sizes)}"
+            )
+        summaries = self.snapshot(
+            "StoreSummaries"
+        )  # Consistent counters, the live ones change under concurrent bookings
+
+        def free(store):
+            summary = summaries.find("StoreID", store["StoreID"])
+            return self.free_kennels_for(summary["Kennels"], size) if summary else 0
+
+        matches = self.store_grid.nearest(
+            lat,
+            lon,
+            radius,
+            limit,
+            lambda store: free(store) > 0,
+        )  # Only stores that can actually host the dog are returned
+        return json.dumps(
+            [
+                {
+                    "StoreID": store["StoreID"],
+                    "Name": store["Name"],
+                    "Location": store["Location"],
+                    "Distance": round(distance, 3),  # Kilometres
+                    "FreeKennels": free(store),
+                }
+                for distance, store in matches
+            ]
+        )
+
+    def position_of(self, snapshot, id_field, after, entries):
+        """Return the position right after the entry with the given ID."""
+        if (
+            entries is not snapshot.entries
+        ):  # A filtered selection is short enough to scan
+            positions = {str(entry[id_field]): i for i, entry in enumerate(entries)}
+        else:
+            positions = snapshot.positions  # Built with the snapshot
+        if after not in positions:
+            raise cherrypy.HTTPError(400, "Invalid cursor")
+        return positions[after] + 1
+
+    @staticmethod
+    def client_has(etag):
+        """Tell whether the If-None-Match header of the request matches an ETag."""
+        if_none_match = cherrypy.request.headers.get("If-None-Match", "")
+        return if_none_match.strip() == "*" or etag in [
+            tag.strip() for tag in if_none_match.split(",")
+        ]
+
+    def cached_response(self, name, version, render):
+        """Serve a cached serialized response with its ETag, or 304 if the client already has it."""
+        etag, body = self.responses.get(name, version, render)
+        cherrypy.response.headers["ETag"] = etag
+        if self.client_has(etag):  # The client's copy is still current
+            cherrypy.response.status = 304
+            return b""
+        return body
+
+    def replace_picture(self, old, file):
+        """Store an uploaded picture, release the one it replaces and return its hash."""
+        if not isinstance(file, SpoolFile):  # Parsed without the stream_uploads tool
+            file = SpoolFile.copy_of(file, self.upload_directory, self.max_upload_size)
+        picture = self.images.submit(file)
+        self.picture_refs[picture] = self.picture_refs.get(picture, 0) + 1
+        self.release_picture(old)  # After counting the new one, they may be the same
+        return picture
+
+    def release_picture(self, picture):
+        """Drop a reference to a picture and delete its files when nothing shows it anymore."""
+        if not picture:
+            return
+        refs = self.picture_refs.get(picture, 1) - 1
+        if refs > 0:
+            self.picture_refs[picture] = refs
+            return
+        self.picture_refs.pop(picture, None)
+        self.images.remove(picture)
+
+    def serve_picture(self, picture, size):
+        """Serve a size variant of a stored picture, waiting if it is still being processed."""
+        if size not in ImagePipeline.variants:
+            raise cherrypy.HTTPError(
+                400, f"Invalid size, use one of {', '.join(ImagePipeline.variants)}"
+            )
+        if ImagePipeline.is_hash(picture):  # The content of a hash never changes
+            etag = f'"{picture}-{size}"'
+            cherrypy.response.headers["ETag"] = etag
+            cherrypy.response.headers["Cache-Control"] = (
+                "public, max-age=31536000, immutable"
+            )
+            if self.client_has(etag):
+                cherrypy.response.status = 304
+                return b""
+        self.images.wait(picture)
+        path = self.images.path_of(picture, size)
+        if not os.path.exists(path):  # Pictures uploaded before the variants existed
+            path = self.images.path_of(picture)
+        if self.sendfile_prefix:  # The reverse proxy sends the file with sendfile()
+            cherrypy.response.headers["Content-Type"] = "image/jpeg"
+            cherrypy.response.headers["X-Accel-Redirect"] = self.sendfile_prefix + path
+            return b""
+        cherrypy.response.stream = True  # Send the file in chunks, not from memory
+        return static.serve_file(
+            os.path.abspath(path),
+            content_type="image/jpeg",
+            disposition="attachment",
+            name=os.path.basename(path),
+        )  # Answers Range requests with 206 and the requested bytes
+
+    def status_version(self):
+        """Version of the status views, which ignore heartbeats that do not change availability."""
+        return (
+            self.responses.version("Devices"),
+            self.responses.version("Services"),
+            self.status_events.version,
+        )
+
+    def live_devices(self):
+        """Return the devices with LastAvailable and Available taken from the liveness registry."""
+        return self.liveness.merge(
+            "sensor", self.snapshot("Devices").entries, "DeviceID"
+        )
+
+    def live_services(self):
+        """Return the services with LastAvailable and Available taken from the liveness registry."""
+        return self.liveness.merge(
+            "service", self.snapshot("Services").entries, "ServiceID"
+        )
+
+    def snapshot(self, name):
+        """Return the read-only snapshot of a collection as served to clients."""
+        collection = self.snapshot_sources.get(name, name)
+        return self.snapshots.get(
+            name,
+            lambda: self.responses.version(collection),
+            lambda: self.build_snapshot(name),
+        )
+
+    def carry_snapshots(self, collection, entity, key, version):
+        """Update the snapshots of a collection for a change by copying only the changed entry."""
+        current = self.responses.version(collection)
+        if collection == "Users":
+            user = self.find_indexed(self.users_by_id, key["UserID"])
+            self.snapshots.carry(
+                "Users",
+                version,
+                current,
+                lambda snapshot: snapshot.replace(
+                    key["UserID"], self.public_user(user) if user else None
+                ),
+            )
+            self.snapshots.carry(
+                "Dogs",
+                version,
+                current,
+                lambda snapshot: (
+                    snapshot.replace(key["DogID"], self.resolved_dogs.get(key["DogID"]))
+                    if entity == "dog"
+                    else snapshot  # The dogs are logged as their own changes
+                ),
+            )
+        elif collection == "Stores":
+            store = self.find_indexed(self.stores_by_id, key["StoreID"])
+            self.snapshots.carry(
+                "Stores",
+                version,
+                current,
+                lambda snapshot: snapshot.replace(key["StoreID"], store),
+            )
+            self.snapshots.carry(
+                "StoreSummaries",
+                version,
+                current,
+                lambda snapshot: snapshot.replace(
+                    key["StoreID"], self.store_summary(store) if store else None
+                ),
+            )
+        else:
+            for collection_name, id_field, indexes in self.collection_routes.values():
+                if collection_name == collection and id_field in key:
+                    entry = self.find_indexed(
+                        getattr(self, indexes[id_field]), key[id_field]
+                    )
+                    self.snapshots.carry(
+                        collection,
+                        version,
+                        current,
+                        lambda snapshot: snapshot.replace(key[id_field], entry),
+                    )
+
+    @staticmethod
+    def find_indexed(index, entity_id):
+        """Look an ID up in an index, trying numeric strings as integers too."""
+        entry = index.get(entity_id)
+        if (
+            entry is None
+            and isinstance(entity_id, str)
+            and entity_id.lstrip("-").isdigit()
+        ):  # Numeric IDs are stored as integers
+            entry = index.get(int(entity_id))
+        return entry
+
+    def build_snapshot(self, name):
+        """Copy a collection as served to clients, called with the writer lock held."""
+        if name == "Dogs":
+            return Snapshot(list(self.resolved_dogs.values()), "DogID", ["DogID"])
+        if name == "StoreSummaries":
+            return Snapshot(
+                [self.store_summary(store) for store in self.catalog_data["Stores"]],
+                "StoreID",
+                ["StoreID"],
+            )
+        for collection, id_field, indexes in self.collection_routes.values():
+            if collection == name:
+                entries = self.catalog_data.get(collection, [])
+                if collection == "Users":  # Password hashes never leave the writers
+                    entries = [self.public_user(user) for user in entries]
+                return Snapshot(entries, id_field, list(indexes))
+        raise KeyError(name)
+
+    def checkpoint_liveness(self):
+        """Periodically copy the liveness registry into storage so restarts keep the last heartbeats."""
+        if self.checkpoint_interval <= 0:  # Checkpoints are disabled
+            return
         while True:
-            now = time.time()
-            # Check availability of devices
-            for device in self.catalog_data.get("Devices", []):
-                if "LastAvailable" in device and (
-                    now - device.get("LastAvailable", now) > 180
-                ):  # If LastAvailable is more than 180 seconds ago
-                    device["Available"] = False  # Set the device as not available
-                elif "LastAvailable" not in device:  # If LastAvailable is not present
-                    device["Available"] = False  # Set the device as not available
-
-            # Check availability of services
-            for service in self.catalog_data.get("Services", []):
-                if "LastAvailable" in service and (
-                    now - service.get("LastAvailable", now) > 180
-                ):  # If LastAvailable is more than 180 seconds ago
-                    service["Available"] = False  # Set the service as not available
-                elif "LastAvailable" not in service:  # If LastAvailable is not present
-                    service["Available"] = False  # Set the service as not available
-            self.save_catalog()  # Save the updated catalog data to the JSON file
-            time.sleep(10)  # Sleep for 10 seconds before the next check
+            time.sleep(self.checkpoint_interval)
+            with self.writer:  # Stored entries are changed like any other mutation
+                # Persist only the devices whose liveness changed since the last checkpoint
+                for device in self.live_devices():
+                    stored = self.devices_by_id.get(device["DeviceID"])
+                    if stored is not None and (
+                        stored.get("LastAvailable") != device["LastAvailable"]
+                        or stored.get("Available") != device["Available"]
+                    ):
+                        stored["LastAvailable"] = device["LastAvailable"]
+                        stored["Available"] = device["Available"]
+                        self.storage.put_device(
+                            stored, self.durability_of("availability")
+                        )
+                        self.responses.bump("Devices")
+
+                # Persist only the services whose liveness changed since the last checkpoint
+                for service in self.live_services():
+                    stored = self.services_by_id.get(service["ServiceID"])
+                    if stored is not None and (
+                        stored.get("LastAvailable") != service["LastAvailable"]
+                        or stored.get("Available") != service["Available"]
+                    ):
+                        stored["LastAvailable"] = service["LastAvailable"]
+                        stored["Available"] = service["Available"]
+                        self.storage.put_service(
+                            stored, self.durability_of("availability")
+                        )
+                        self.responses.bump("Services")
 
 
 if __name__ == "__main__":
@@ -1238,11 +2142,18 @@ if __name__ == "__main__":
     ip = s.getsockname()[0]  # getting the IP address of the container
     s.close()
     catalog = Catalog()  # Initialize the Catalog class
+    cherrypy.tools.encode_response = (
+        ResponseEncoder().tool()
+    )  # Compressed or MessagePack bodies for the clients that ask for them
     conf = {
         "/": {
             "request.dispatch": cherrypy.dispatch.MethodDispatcher(),
             "tools.sessions.on": True,
             "request.show_tracebacks": False,
+            "tools.stream_uploads.on": True,
+            "tools.stream_uploads.directory": catalog.upload_directory,
+            "tools.stream_uploads.max_size": catalog.max_upload_size,
+            "tools.encode_response.on": True,
         }
     }  # Configuration for the CherryPy server
     cherrypy.tree.mount(catalog, "/", conf)  # Mount the Catalog class to the root
@@ -1252,14 +2163,49 @@ if __name__ == "__main__":
     cherrypy.config.update(
         {"server.socket_port": 8080}
     )  # Set the server socket port to 8080
+    cherrypy.config.update(
+        {"server.max_request_body_size": catalog.max_upload_size * 2}
+    )  # Bodies announced larger than this are refused before being read
+    cherrypy.config.update(
+        {"server.thread_pool": 10 + catalog.status_events.max_clients}
+    )  # Status streams hold a thread each, keep the default 10 for the API
+
+    expiry_thread = threading.Thread(
+        target=catalog.liveness.run
+    )  # Create a thread that marks devices and services unavailable when their window lapses
+    expiry_thread.daemon = True  # The thread will terminate when the program ends
+    expiry_thread.start()  # Start the thread
 
     check_heartbeat_thread = threading.Thread(
-        target=catalog.check_availability
-    )  # Create a thread to check availability of the
+        target=catalog.checkpoint_liveness
+    )  # Create a thread to checkpoint the liveness of devices and services
     check_heartbeat_thread.daemon = (
         True  # The thread will terminate when the program ends
     )
     check_heartbeat_thread.start()  # Start the thread
 
+    code_purge_thread = threading.Thread(
+        target=catalog.codes.run
+    )  # Create a thread that drops expired registration and recovery codes
+    code_purge_thread.daemon = True  # The thread will terminate when the program ends
+    code_purge_thread.start()  # Start the thread
+
+    catalog.storage.start()  # Start the background flusher of the catalog
+    catalog.outbox.start()  # Start sending the queued e-mails
+    catalog.client.subscribe(
+        catalog.heartbeat_topic + "/+/+", 1
+    )  # Heartbeats and Last Wills of every device and service, restored on every connection
+    catalog.client.start()  # Connect to the broker in the background, the REST API works without it
+    catalog.publish_state()  # Refresh the retained messages of every entity, queued until connected
+    cherrypy.engine.subscribe("stop", catalog.client.stop)
+    cherrypy.engine.subscribe("stop", catalog.hasher.stop)
+    cherrypy.engine.subscribe("stop", catalog.status_events.stop)
+    cherrypy.engine.subscribe(
+        "stop", catalog.images.stop
+    )  # Finish writing the queued pictures
+    cherrypy.engine.subscribe(
+        "stop", catalog.flush
+    )  # Write pending mutations when the server stops
+
     cherrypy.engine.start()  # Start the CherryPy server
     cherrypy.engine.block()  # Block the main thread to keep the server running until KeyboardInterrupt
@@ -0,0 +1,53 @@
+import collections
+import copy
+import itertools
+import threading
+import time
+
+
+class ChangeFeed:
+    """Bounded, ordered log of entity-level catalog mutations for GET /changes."""
+
+    def __init__(self, boot, capacity=1000):
+        self.boot = boot  # Sequence numbers restart with the process, so clients compare this too
+        self._changes = collections.deque(
+            maxlen=capacity
+        )  # Oldest changes fall off once the ring is full
+        self._seq = 0  # Sequence number of the latest change
+        self._lock = threading.Lock()
+
+    def record(self, collection, entity, op, key, value=None):
+        """Append a change, copying the entity so later mutations do not leak into the log."""
+        with self._lock:
+            self._seq += 1
+            self._changes.append(
+                {
+                    "Seq": self._seq,
+                    "Time": time.time(),
+                    "Collection": collection,
+                    "Entity": entity,
+                    "Op": op,  # "put" carries the whole entity, "delete" only its key
+                    "Key": key,
+                    "Value": copy.deepcopy(value),
+                }
+            )
+            return self._seq
+
+    def since(self, seq, boot=None):
+        """Return the changes after seq, or a resync signal if they are no longer in the ring."""
+        with self._lock:
+            oldest = self._changes[0]["Seq"] if self._changes else self._seq + 1
+            if (
+                (boot is not None and boot != self.boot)
+                or seq > self._seq
+                or seq < oldest - 1
+            ):  # The cursor is from another boot or fell off the ring
+                return {"Boot": self.boot, "Seq": self._seq, "Resync": True}
+            return {
+                "Boot": self.boot,
+                "Seq": self._seq,
+                "Resync": False,
+                "Changes": list(
+                    itertools.islice(self._changes, seq - oldest + 1, None)
+                ),  # Sequence numbers are contiguous, so the offset is direct
+            }
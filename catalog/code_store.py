@@ -0,0 +1,99 @@
+import collections
+import secrets
+import threading
+import time
+
+
+class CodeStore:
+    """Registration and recovery codes keyed by e-mail, each valid for a limited time."""
+
+    def __init__(
+        self, ttl=900, max_attempts=5, min_interval=60, max_per_hour=5, capacity=10000
+    ):
+        self.ttl = ttl  # Seconds a code stays valid
+        self.max_attempts = max_attempts  # Wrong guesses before a code is dropped
+        self.min_interval = (
+            min_interval  # Seconds between two codes for the same e-mail
+        )
+        self.max_per_hour = max_per_hour  # Codes issued to the same e-mail per hour
+        self.capacity = (
+            capacity  # Codes and e-mails tracked at most, oldest dropped first
+        )
+        self._codes = (
+            collections.OrderedDict()
+        )  # (purpose, email) -> [code, expiry, attempts], oldest first
+        self._issued = (
+            collections.OrderedDict()
+        )  # (purpose, email) -> issue times within the last hour, least recent first
+        self._lock = threading.Lock()
+
+    def try_issue(self, purpose, email, code):
+        """Store a code for an e-mail, replacing the previous one, unless the throttling refuses it."""
+        key = (purpose, email)
+        now = time.time()
+        with self._lock:  # Checked and recorded at once, concurrent requests cannot both pass
+            issued = [t for t in self._issued.get(key, ()) if now - t < 3600]
+            if len(issued) >= self.max_per_hour:
+                return False
+            if issued and now - issued[-1] < self.min_interval:
+                return False
+            self._codes.pop(key, None)
+            self._codes[key] = [code, now + self.ttl, 0]  # Newest at the end
+            while len(self._codes) > self.capacity:
+                self._codes.popitem(last=False)
+            self._issued.pop(key, None)
+            self._issued[key] = issued + [now]  # Most recent at the end
+            while len(self._issued) > self.capacity:
+                self._issued.popitem(last=False)
+            return True
+
+    def peek(self, purpose, email, code):
+        """Check a code without consuming it, counting failed attempts."""
+        return self._check(purpose, email, code, consume=False)
+
+    def verify(self, purpose, email, code):
+        """Check a code, consuming it on success and counting failed attempts."""
+        return self._check(purpose, email, code, consume=True)
+
+    def _check(self, purpose, email, code, consume):
+        key = (purpose, email)
+        with self._lock:
+            entry = self._codes.get(key)
+            if entry is None:
+                return False
+            if entry[1] <= time.time():  # Expired since the last purge
+                del self._codes[key]
+                return False
+            if secrets.compare_digest(
+                entry[0].encode(), str(code).encode()
+            ):  # Bytes, compare_digest refuses non-ASCII strings
+                if consume:
+                    del self._codes[
+                        key
+                    ]  # Remove the code after verification to prevent reuse
+                return True
+            entry[2] += 1
+            if entry[2] >= self.max_attempts:  # Too many guesses, a new code is needed
+                del self._codes[key]
+            return False
+
+    def purge(self):
+        """Drop expired codes and issue times older than an hour."""
+        now = time.time()
+        with self._lock:
+            while self._codes:
+                key, entry = next(iter(self._codes.items()))
+                if entry[1] > now:  # Codes expire in insertion order
+                    break
+                del self._codes[key]
+            while self._issued:
+                key, issued = next(iter(self._issued.items()))
+                if now - issued[-1] < 3600:
+                    break
+                del self._issued[key]
+
+    def run(self, interval=60):
+        """Purge periodically so codes nobody tries again do not pile up."""
+        while True:
+            time.sleep(interval)
+            self.purge()
@@ -0,0 +1,13 @@
+import cherrypy
+
+
+class RetryLater(cherrypy.HTTPError):
+    """HTTPError that keeps its Retry-After header, CherryPy strips the one set on the response."""
+
+    def __init__(self, status, message, retry_after):
+        cherrypy.HTTPError.__init__(self, status, message)
+        self.retry_after = retry_after  # Seconds the client should wait
+
+    def set_response(self):
+        cherrypy.HTTPError.set_response(self)  # Cleans the headers of an error page
+        cherrypy.serving.response.headers["Retry-After"] = str(self.retry_after)
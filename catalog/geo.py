@@ -0,0 +1,105 @@
+import math
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32  # Length of a degree of latitude
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres (haversine formula)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(dphi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class GridIndex:
+    """Uniform latitude/longitude grid for nearest-neighbour searches over points."""
+
+    def __init__(self, cell_degrees=0.1):
+        self.cell_degrees = cell_degrees  # About 11 km of latitude per cell
+        self._cells = {}  # (row, column) -> list of (latitude, longitude, item)
+        self._rows = None  # (first, last) row holding items, None while empty
+        self._columns = None  # (first, last) column holding items
+
+    def _cell(self, lat, lon):
+        return (
+            math.floor(lat / self.cell_degrees),
+            math.floor(lon / self.cell_degrees),
+        )
+
+    def insert(self, lat, lon, item):
+        """Add an item located at the given coordinates."""
+        row, column = self._cell(lat, lon)
+        self._cells.setdefault((row, column), []).append((lat, lon, item))
+        self._rows = (
+            (min(self._rows[0], row), max(self._rows[1], row))
+            if self._rows
+            else (row, row)
+        )
+        self._columns = (
+            (min(self._columns[0], column), max(self._columns[1], column))
+            if self._columns
+            else (column, column)
+        )
+
+    def _ring(self, row, column, ring, max_rows, max_columns):
+        """Yield the cells on the perimeter of a ring that lie inside the populated area."""
+        first_row, last_row = self._rows
+        first_column, last_column = self._columns
+        columns = range(
+            max(column - min(ring, max_columns), first_column),
+            min(column + min(ring, max_columns), last_column) + 1,
+        )
+        if ring <= max_rows:  # Top and bottom sides
+            for r in {row - ring, row + ring}:
+                if first_row <= r <= last_row:
+                    for c in columns:
+                        yield r, c
+        if 0 < ring <= max_columns:  # Left and right sides, without the corners
+            rows = range(
+                max(row - min(ring - 1, max_rows), first_row),
+                min(row + min(ring - 1, max_rows), last_row) + 1,
+            )
+            for c in (column - ring, column + ring):
+                if first_column <= c <= last_column:
+                    for r in rows:
+                        yield r, c
+
+    def nearest(self, lat, lon, radius_km, k, accept=lambda item: True):
+        """Return up to k (distance, item) pairs within radius_km, closest first, whose item is accepted."""
+        if not self._cells:
+            return []
+        row, column = self._cell(lat, lon)
+        cos_lat = max(
+            math.cos(math.radians(min(abs(lat) + radius_km / KM_PER_DEGREE, 89.9))),
+            1e-6,
+        )  # Narrowest longitude spacing inside the search area
+        cell_km = self.cell_degrees * KM_PER_DEGREE * cos_lat  # Smallest cell side
+        max_rows = math.ceil(radius_km / (self.cell_degrees * KM_PER_DEGREE))
+        max_columns = math.ceil(radius_km / cell_km)
+        last_ring = min(
+            max(max_rows, max_columns),
+            max(
+                row - self._rows[0],
+                self._rows[1] - row,
+                column - self._columns[0],
+                self._columns[1] - column,
+            ),
+        )  # Rings beyond the populated cells hold nothing
+        found = []
+        for ring in range(last_ring + 1):
+            if (
+                len(found) >= k and (ring - 1) * cell_km > found[k - 1][0]
+            ):  # Every cell of this ring is farther than the k-th match
+                break
+            for cell in self._ring(row, column, ring, max_rows, max_columns):
+                for point_lat, point_lon, item in self._cells.get(cell, ()):
+                    distance = distance_km(lat, lon, point_lat, point_lon)
+                    if distance <= radius_km and accept(item):
+                        found.append((distance, item))
+            found.sort(key=lambda match: match[0])
+        return found[:k]
@@ -0,0 +1,136 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cherrypy
+from PIL import Image, ImageOps
+
+
+class ImagePipeline:
+    """Stores uploaded pictures under their content hash as metadata-free progressive JPEG variants built in the background."""
+
+    variants = {
+        "full": 1600,
+        "medium": 512,
+        "thumb": 128,
+    }  # Longest side in pixels, from largest to smallest
+
+    def __init__(self, directory="pictures", workers=2, quality=82, timeout=30):
+        self.directory = directory
+        self.quality = quality
+        self.timeout = (
+            timeout  # Seconds a GET waits for a picture still being processed
+        )
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers
+        )  # Pillow releases the GIL while decoding, resizing and encoding
+        self._pending = {}  # hash -> future of the upload being processed
+        self._generations = {}  # hash -> number of the latest upload or removal
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_hash(picture):
+        """Tell a content hash from the file path stored by older versions of the catalog."""
+        return "/" not in picture
+
+    def path_of(self, picture, size="full"):
+        """Return the file of a variant of a picture, given by hash or by legacy path."""
+        if not self.is_hash(picture):
+            if size == "full":
+                return picture
+            stem, extension = os.path.splitext(picture)
+            return f"{stem}_{size}{extension}"
+        return os.path.join(
+            self.directory, picture[:2], f"{picture}_{size}.jpg"
+        )  # Spread over 256 directories
+
+    def submit(self, upload):
+        """Check that a spooled upload is a picture, queue its variants unless they exist and return its hash."""
+        try:
+            with Image.open(upload.name):  # Parses the header only
+                pass
+        except (Image.DecompressionBombError, OSError, ValueError):
+            upload.discard()
+            raise cherrypy.HTTPError(400, "The uploaded file is not a supported image")
+        picture = upload.digest.hexdigest()
+        with self._lock:
+            if picture in self._pending or os.path.exists(
+                self.path_of(picture, "thumb")
+            ):  # Same upload as an existing picture, the thumb is written last
+                upload.discard()
+                return picture
+            generation = self._generations.get(picture, 0) + 1
+            self._generations[picture] = generation
+            source = self.path_of(picture) + f".{generation}.upload"
+            os.makedirs(os.path.dirname(source), exist_ok=True)
+            upload.move(source)  # Kept until the variants are written
+            self._pending[picture] = self._pool.submit(
+                self._process, source, picture, generation
+            )
+        return picture
+
+    def wait(self, picture):
+        """Wait until the variants of a picture are written, if they are being processed."""
+        future = self._pending.get(picture)
+        if future is not None:
+            try:
+                future.result(self.timeout)
+            except Exception:
+                pass  # Logged by the worker, the caller finds no file
+
+    def remove(self, picture):
+        """Delete every variant of a picture."""
+        with self._lock:
+            self._generations[picture] = (
+                self._generations.get(picture, 0) + 1
+            )  # A pending job must not write the files back
+            self._pending.pop(picture, None)
+        for size in self.variants:
+            try:
+                os.remove(self.path_of(picture, size))
+            except FileNotFoundError:
+                pass
+
+    def _process(self, source, picture, generation):
+        try:
+            with Image.open(source) as image:
+                image.draft(
+                    "RGB", (self.variants["full"],) * 2
+                )  # JPEG decodes straight at a reduced scale
+                image = ImageOps.exif_transpose(image)  # Apply the camera rotation
+                image = image.convert("RGB")  # Drops alpha, palette and metadata
+            for size, side in self.variants.items():  # Each from the previous one
+                image.thumbnail((side, side), Image.LANCZOS)
+                buffer = io.BytesIO()
+                image.save(
+                    buffer,
+                    "JPEG",
+                    quality=self.quality,
+                    optimize=True,
+                    progressive=True,
+                )  # No exif or icc_profile is passed, so none is written
+                self._write(picture, size, buffer.getvalue(), generation)
+        except Exception as e:
+            print(f"Error processing picture {picture}: {e}")
+            raise
+        finally:
+            os.remove(source)  # The original keeps the metadata the variants dropped
+            with self._lock:
+                if self._generations.get(picture) == generation:
+                    self._pending.pop(picture, None)
+
+    def _write(self, picture, size, data, generation):
+        target = self.path_of(picture, size)
+        temporary = f"{target}.{generation}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        with self._lock:
+            if self._generations.get(picture) != generation:
+                os.remove(temporary)  # The picture was removed meanwhile
+                return
+            os.replace(temporary, target)  # Readers never see a partial file
+
+    def stop(self):
+        """Stop the worker threads after the queued pictures are written."""
+        self._pool.shutdown(wait=True)
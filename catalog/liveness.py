@@ -0,0 +1,138 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class LivenessRegistry:
+    """In-memory record of when each device and service last sent a heartbeat."""
+
+    def __init__(self, windows=None, default_window=180):
+        self.windows = dict(
+            windows or {}
+        )  # Category -> seconds after the last heartbeat before an entry is unavailable
+        self.default_window = default_window  # Window of categories not listed above
+        self._last_seen = {}  # (category, ID) -> timestamp of the last heartbeat
+        self._deadlines = {}  # (category, ID) -> deadline of an available entry
+        self._heap = []  # (deadline, sequence, (category, ID)), stale ones skipped
+        self._sequence = itertools.count()  # Breaks ties between equal deadlines
+        self._versions = {}  # Category -> number of changes, including every heartbeat
+        self._listeners = []  # Callables notified with (category, ID, available)
+        self._condition = threading.Condition()
+
+    def window(self, category):
+        """Return the availability window of a category in seconds."""
+        return self.windows.get(category, self.default_window)
+
+    def version(self, category):
+        """Return a counter that changes whenever an entry of the category changes."""
+        return self._versions.get(category, 0)
+
+    def subscribe(self, listener):
+        """Call listener(category, ID, available) whenever an entry changes availability."""
+        self._listeners.append(listener)
+
+    def seed(self, category, entity_id, last_seen):
+        """Restore the last heartbeat of an entry from the persisted catalog."""
+        if last_seen:  # A LastAvailable of 0 means the entry was never seen
+            with self._condition:
+                self._last_seen[(category, entity_id)] = last_seen
+                deadline = last_seen + self.window(category)
+                if deadline > time.time():  # Still within its window after a restart
+                    self._schedule((category, entity_id), deadline)
+
+    def beat(self, category, entity_id):
+        """Record a heartbeat received now and push the entry's deadline forward."""
+        key = (category, entity_id)
+        with self._condition:
+            now = time.time()
+            was_available = key in self._deadlines
+            self._last_seen[key] = now
+            self._bump(category)
+            self._schedule(key, now + self.window(category))
+        if not was_available:
+            self._notify(category, entity_id, True)
+
+    def expire(self, category, entity_id):
+        """Mark an entry unavailable now, without waiting for its window to lapse."""
+        key = (category, entity_id)
+        with self._condition:
+            was_available = (
+                self._deadlines.pop(key, None) is not None
+            )  # Its heap entry becomes stale
+            if was_available:
+                self._bump(category)
+        if was_available:
+            self._notify(category, entity_id, False)
+
+    def forget(self, category, entity_id):
+        """Drop an entry that was removed from the catalog."""
+        with self._condition:
+            self._last_seen.pop((category, entity_id), None)
+            self._bump(category)
+            self._deadlines.pop(
+                (category, entity_id), None
+            )  # Its heap entry becomes stale
+
+    def last_seen(self, category, entity_id):
+        """Return the timestamp of the last heartbeat, or None if the entry was never seen."""
+        return self._last_seen.get((category, entity_id))
+
+    def is_available(self, category, entity_id):
+        """Tell whether the entry sent a heartbeat within the availability window."""
+        return (category, entity_id) in self._deadlines
+
+    def merge(self, category, entries, id_field):
+        """Return copies of the entries with LastAvailable and Available taken from the registry."""
+        merged = []
+        for entry in entries:
+            entity_id = entry.get(id_field)
+            last_seen = self._last_seen.get((category, entity_id))
+            merged.append(
+                dict(
+                    entry,
+                    LastAvailable=(
+                        last_seen
+                        if last_seen is not None
+                        else entry.get("LastAvailable", 0)
+                    ),
+                    Available=(category, entity_id) in self._deadlines,
+                )
+            )
+        return merged
+
+    def run(self):
+        """Flip entries to unavailable as soon as their deadline lapses."""
+        while True:
+            expired = []
+            with self._condition:
+                now = time.time()
+                while not self._heap or self._heap[0][0] > now:
+                    self._condition.wait(
+                        self._heap[0][0] - now if self._heap else None
+                    )  # Sleep until the earliest deadline or until an earlier one is scheduled
+                    now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    deadline, _, key = heapq.heappop(self._heap)
+                    if (
+                        self._deadlines.get(key) == deadline
+                    ):  # Skip deadlines superseded by a later heartbeat
+                        del self._deadlines[key]
+                        self._bump(key[0])
+                        expired.append(key)
+            for category, entity_id in expired:
+                self._notify(category, entity_id, False)
+
+    def _schedule(self, key, deadline):
+        """Set the deadline of an entry, waking the scheduler if it is now the earliest one."""
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._sequence), key))
+        if self._heap[0][0] == deadline:
+            self._condition.notify()
+
+    def _bump(self, category):
+        self._versions[category] = self._versions.get(category, 0) + 1
+
+    def _notify(self, category, entity_id, available):
+        for listener in self._listeners:
+            listener(category, entity_id, available)
@@ -0,0 +1,186 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import requests
+
+
+class PermanentError(Exception):
+    """A delivery failure that retrying will not fix, e.g. a rejected address."""
+
+
+class MailgunTransport:
+    """Sends e-mails through the Mailgun HTTP API."""
+
+    def __init__(self, api_url, api_key, from_address, timeout=10):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.from_address = from_address
+        self.timeout = timeout  # Seconds before a slow Mailgun fails the attempt
+
+    def send(self, to, subject, text):
+        """Deliver one e-mail, raising on failure."""
+        response = requests.post(
+            self.api_url,
+            auth=("api", self.api_key),
+            data={
+                "from": self.from_address,
+                "to": to,
+                "subject": subject,
+                "text": text,
+            },
+            timeout=self.timeout,
+        )  # Send a POST request to the Mailgun API
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            raise PermanentError(f"Mailgun rejected the e-mail: {response.status_code}")
+        response.raise_for_status()  # Server errors and rate limits are retried
+
+
+class FakeMailgun:
+    """Stand-in for Mailgun that keeps sent e-mails in memory, for tests and local runs."""
+
+    def __init__(self, failures=0, delay=0):
+        self.failures = failures  # Number of upcoming attempts that fail
+        self.delay = delay  # Seconds each attempt takes
+        self.sent = []  # (to, subject, text) of every delivered e-mail
+        self._lock = threading.Lock()
+
+    def send(self, to, subject, text):
+        """Record the e-mail, or fail while failures are left."""
+        time.sleep(self.delay)
+        with self._lock:
+            if self.failures > 0:
+                self.failures -= 1
+                raise requests.exceptions.ConnectionError("Fake Mailgun failure")
+            self.sent.append((to, subject, text))
+        print(f"Fake e-mail to {to}: {subject}")
+
+
+class Outbox:
+    """Persistent e-mail queue drained by a pool of sender threads with retries and backoff."""
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS Outbox (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            Recipient TEXT NOT NULL,
+            Subject TEXT NOT NULL,
+            Body TEXT NOT NULL,
+            Status TEXT NOT NULL DEFAULT 'pending',
+            Attempts INTEGER NOT NULL DEFAULT 0,
+            NextAttempt REAL NOT NULL,
+            LastError TEXT
+        );
+        CREATE INDEX IF NOT EXISTS OutboxDue ON Outbox (Status, NextAttempt);
+    """  # Status is "pending" until the e-mail is "sent" or has "failed" for good
+
+    def __init__(
+        self, path, transport, workers=2, max_attempts=6, base_delay=2, max_delay=300
+    ):
+        self.transport = transport
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay  # Seconds before the first retry, then doubled
+        self.max_delay = max_delay
+        self._in_flight = set()  # IDs being sent by a worker
+        self._condition = (
+            threading.Condition()
+        )  # Protects the connection and the in-flight set
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)  # Ensure the database directory exists
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "PRAGMA synchronous=FULL"
+        )  # An enqueued e-mail survives a power loss
+        self._db.executescript(self.schema)
+
+    def enqueue(self, to, subject, text):
+        """Store an e-mail for delivery and return its ID once it is on disk."""
+        with self._condition:
+            with self._db:  # Commit before returning
+                cursor = self._db.execute(
+                    "INSERT INTO Outbox (Recipient, Subject, Body, NextAttempt) VALUES (?, ?, ?, ?)",
+                    (to, subject, text, time.time()),
+                )
+            self._condition.notify()  # Wake a sender
+            return cursor.lastrowid
+
+    def wait(self, message_id, timeout):
+        """Wait up to timeout seconds for the first delivery attempt and return the message status."""
+        deadline = time.time() + timeout
+        with self._condition:
+            while True:
+                status, attempts = self._db.execute(
+                    "SELECT Status, Attempts FROM Outbox WHERE ID = ?", (message_id,)
+                ).fetchone()
+                remaining = deadline - time.time()
+                if attempts > 0 or remaining <= 0:
+                    return status
+                self._condition.wait(remaining)  # Woken after every attempt
+
+    def start(self):
+        """Start the sender threads, resuming the e-mails left pending by a restart."""
+        with self._condition:
+            with self._db:
+                self._db.execute(
+                    "DELETE FROM Outbox WHERE Status = 'sent' AND NextAttempt < ?",
+                    (time.time() - 7 * 24 * 3600,),
+                )  # Keep a week of delivered e-mails
+        for _ in range(self.workers):
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _claim(self):
+        """Return the next due message not being sent by another worker, or the seconds until one is due."""
+        now = time.time()
+        rows = self._db.execute(
+            "SELECT ID, Recipient, Subject, Body, Attempts, NextAttempt FROM Outbox "
+            "WHERE Status = 'pending' ORDER BY NextAttempt LIMIT ?",
+            (len(self._in_flight) + 1,),
+        ).fetchall()  # One more than the messages in flight is enough to find a free one
+        for row in rows:
+            if row[0] in self._in_flight:
+                continue
+            if row[5] > now:
+                return None, row[5] - now
+            self._in_flight.add(row[0])
+            return row, None
+        return None, None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                message, wait = self._claim()
+                while message is None:
+                    self._condition.wait(wait)  # None waits for the next enqueue
+                    message, wait = self._claim()
+            message_id, to, subject, text, attempts, _ = message
+            error = None
+            try:
+                self.transport.send(to, subject, text)
+                status = "sent"
+            except PermanentError as e:
+                status, error = "failed", str(e)
+            except Exception as e:  # Network errors, timeouts and server errors
+                attempts_made = attempts + 1
+                status = "failed" if attempts_made >= self.max_attempts else "pending"
+                error = str(e)
+            delay = min(self.base_delay * 2**attempts, self.max_delay)
+            with self._condition:
+                with self._db:
+                    self._db.execute(
+                        "UPDATE Outbox SET Status = ?, Attempts = Attempts + 1, "
+                        "NextAttempt = ?, LastError = ? WHERE ID = ?",
+                        (
+                            status,
+                            time.time()
+                            + delay * random.uniform(0.5, 1.5),  # Jittered backoff
+                            error,
+                            message_id,
+                        ),
+                    )
+                self._in_flight.discard(message_id)
+                self._condition.notify_all()  # Wake wait() callers and idle senders
+            if error:
+                print(f"Error sending e-mail {message_id} to {to}: {error}")
@@ -0,0 +1,59 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+from errors import RetryLater
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded process pool so it never occupies the request threads' CPU."""
+
+    def __init__(self, workers=2, max_queue=16, rounds=12, timeout=30):
+        self.rounds = rounds  # Cost of new hashes, older hashes are upgraded on login
+        self.timeout = timeout  # Seconds a request waits for its hash before giving up
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )  # Spawned workers do not inherit the server's threads and locks
+        self._slots = threading.BoundedSemaphore(
+            workers + max_queue
+        )  # Running plus queued jobs
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(blocking=False):  # Reject at once when saturated
+            raise RetryLater(503, "Too many password operations, retry later", 1)
+        try:
+            future = self._pool.submit(function, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(self.timeout)
+
+    def hash(self, password):
+        """Return the bcrypt hash of a password at the configured cost."""
+        return self._run(_hash, password.encode("utf-8"), self.rounds).decode("utf-8")
+
+    def verify(self, password, hashed):
+        """Tell whether a password matches a bcrypt hash."""
+        return self._run(_check, password.encode("utf-8"), hashed.encode("utf-8"))
+
+    def needs_rehash(self, hashed):
+        """Tell whether a hash was made with a cost other than the configured one."""
+        try:
+            return int(hashed.split("$")[2]) != self.rounds  # "$2b$<cost>$<salt+hash>"
+        except (IndexError, ValueError):
+            return False
+
+    def stop(self):
+        """Shut the worker processes down."""
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,33 @@
+import threading
+import uuid
+
+
+class ResponseCache:
+    """Serialized catalog responses, reused until the collections they were built from change."""
+
+    def __init__(self):
+        self.boot = uuid.uuid4().hex[
+            :8
+        ]  # Keeps ETags from colliding across restarts, when the counters start over
+        self._versions = {}  # Collection name -> number of mutations since start
+        self._responses = {}  # Response name -> (version, ETag, serialized body)
+        self._lock = threading.Lock()
+
+    def bump(self, collection):
+        """Record a mutation of a collection, invalidating the responses built from it."""
+        with self._lock:
+            self._versions[collection] = self._versions.get(collection, 0) + 1
+
+    def version(self, collection):
+        """Return the current version of a collection."""
+        return self._versions.get(collection, 0)
+
+    def get(self, name, version, render):
+        """Return (ETag, body) of a response, calling render() only if the version changed."""
+        cached = self._responses.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+        body = render().encode("utf-8")  # Serialized once per version
+        etag = '"%s-%s-%s"' % (self.boot, name, ".".join(str(v) for v in version))
+        self._responses[name] = (version, etag, body)
+        return etag, body
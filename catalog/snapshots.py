@@ -0,0 +1,91 @@
+import copy
+
+
+class Snapshot:
+    """Read-only copy of a collection with lookup tables over its unique fields; never modified once built."""
+
+    def __init__(self, entries, id_field, fields):
+        self.id_field = id_field
+        self.entries = copy.deepcopy(
+            entries
+        )  # Detached from the objects the writers keep changing
+        self.lookups = {field: {} for field in fields}  # Field -> value -> entry
+        for entry in self.entries:
+            for field, table in self.lookups.items():
+                if field in entry:
+                    table.setdefault(entry[field], entry)  # First entry on duplicates
+        self.positions = {
+            str(entry[id_field]): i for i, entry in enumerate(self.entries)
+        }  # ID -> position, used by "after" cursors
+
+    def replace(self, entity_id, entry):
+        """Return a new snapshot with one entry replaced, appended or, if entry is None, removed."""
+        position = self.positions.get(str(entity_id))
+        if entry is None and position is None:
+            return self
+        old = self.entries[position] if position is not None else None
+        snapshot = Snapshot.__new__(Snapshot)
+        snapshot.id_field = self.id_field
+        snapshot.entries = list(self.entries)  # Shallow, the other entries are shared
+        snapshot.positions = self.positions
+        if entry is not None:
+            entry = copy.deepcopy(entry)  # Only the changed entry is copied
+        if entry is None:
+            del snapshot.entries[position]
+            snapshot.positions = {
+                str(e[self.id_field]): i for i, e in enumerate(snapshot.entries)
+            }  # Later entries moved up
+        elif position is None:
+            snapshot.positions = dict(self.positions)
+            snapshot.positions[str(entity_id)] = len(snapshot.entries)
+            snapshot.entries.append(entry)
+        else:
+            snapshot.entries[position] = entry
+        snapshot.lookups = {}
+        for field, table in self.lookups.items():
+            table = dict(table)
+            if old is not None and table.get(old.get(field)) is old:
+                del table[old[field]]
+            if entry is not None and field in entry:
+                table.setdefault(entry[field], entry)
+            snapshot.lookups[field] = table
+        return snapshot
+
+    def find(self, field, value):
+        """Return the entry whose field equals value, trying numeric strings as integers too."""
+        table = self.lookups[field]
+        entry = table.get(value)
+        if (
+            entry is None and isinstance(value, str) and value.lstrip("-").isdigit()
+        ):  # Numeric IDs are stored as integers
+            entry = table.get(int(value))
+        return entry
+
+
+class SnapshotStore:
+    """Snapshots shared by reader threads without locking, carried over single-entry changes and rebuilt otherwise."""
+
+    def __init__(self, lock):
+        self._lock = (
+            lock  # The catalog writer lock, no mutation runs while a snapshot is built
+        )
+        self._snapshots = {}  # Name -> (version, snapshot), replaced as a whole
+
+    def get(self, name, version, build):
+        """Return the snapshot of the current version(), calling build() only if it is not cached yet."""
+        cached = self._snapshots.get(name)
+        if cached is not None and cached[0] == version():
+            return cached[1]  # Lock-free path taken by every read until the next write
+        with self._lock:  # Wait for the mutation in progress, if any
+            current = version()  # Stable while the lock is held
+            cached = self._snapshots.get(name)
+            if cached is None or cached[0] != current:
+                cached = (current, build())
+                self._snapshots[name] = cached  # Published with a single assignment
+            return cached[1]
+
+    def carry(self, name, version, current, update):
+        """Move a snapshot built at version to current as update(snapshot), called with the writer lock held."""
+        cached = self._snapshots.get(name)
+        if cached is not None and cached[0] == version:
+            self._snapshots[name] = (current, update(cached[1]))
@@ -0,0 +1,165 @@
+import collections
+import html
+import json
+import string
+import threading
+
+import cherrypy
+
+from errors import RetryLater
+
+PAGE = string.Template("""
+<html>
+<head>
+    <title>Status Page</title>
+    <style>
+        .status-circle {
+            height: 15px;
+            width: 15px;
+            border-radius: 50%;
+            display: inline-block;
+            margin-right: 10px;
+        }
+        .green { background-color: green; }
+        .red { background-color: red; }
+        body { font-family: Arial, sans-serif; margin: 20px; }
+        h1 { color: #333; }
+        h2 { color: #555; border-bottom: 1px solid #eee; padding-bottom: 5px;}
+        ul { list-style-type: none; padding-left: 0; }
+        li { margin-bottom: 8px; padding: 5px; border: 1px solid #ddd; border-radius: 4px; background-color: #f9f9f9; display: flex; align-items: center;}
+        .details { margin-left: 10px; }
+    </style>
+</head>
+<body>
+    <h1>System Status</h1>
+    <h2>Devices</h2><ul>$devices</ul>
+    <h2>Services</h2><ul>$services</ul>
+</body>
+</html>
+""")
+
+ITEM = string.Template("""
+        <li>
+            <span class='status-circle $color'></span>
+            <div class='details'>ID: $id, Name: $name</div>
+        </li>""")
+
+
+def _items(entries, id_field, empty):
+    if not entries:
+        return f"<li>{empty}</li>"
+    return "".join(
+        ITEM.substitute(
+            color="green" if entry.get("Available", False) else "red",
+            id=html.escape(str(entry.get(id_field, "N/A"))),
+            name=html.escape(
+                str(entry.get("Name", f"DefaultNameForID_{entry.get(id_field, 'N/A')}"))
+            ),
+        )
+        for entry in entries
+    )
+
+
+def render_page(devices, services):
+    """Render the status page HTML for devices and services merged with their liveness."""
+    return PAGE.substitute(
+        devices=_items(devices, "DeviceID", "No devices registered."),
+        services=_items(services, "ServiceID", "No services registered."),
+    )
+
+
+def render_json(devices, services):
+    """Render the compact status document: the availability of every device and service by ID."""
+    return json.dumps(
+        {
+            "Devices": {
+                str(device["DeviceID"]): device["Available"] for device in devices
+            },
+            "Services": {
+                str(service["ServiceID"]): service["Available"] for service in services
+            },
+        },
+        separators=(",", ":"),
+    )
+
+
+class StatusEvents:
+    """Counts availability transitions and pushes them to Server-Sent Events clients."""
+
+    def __init__(self, max_clients=4, backlog=100, keepalive=5):
+        self.max_clients = max_clients  # Each client holds a server thread
+        self.backlog = backlog  # Events queued per client before it is dropped
+        self.keepalive = keepalive  # Seconds between comments on an idle stream, a failed one frees the slot
+        self.version = 0  # Availability transitions, used to cache the status views
+        self._clients = set()
+        self._stopped = False
+        self._condition = threading.Condition()
+
+    def notify(self, category, entity_id, available):
+        """Liveness listener: queue a transition for every connected client."""
+        event = (
+            "event: availability\ndata: "
+            + json.dumps(
+                {"Category": category, "ID": entity_id, "Available": available},
+                separators=(",", ":"),
+            )
+            + "\n\n"
+        ).encode("utf-8")
+        with self._condition:
+            self.version += 1
+            for client in self._clients:
+                if len(client.events) >= self.backlog:  # Too slow, it must resync
+                    client.lost = True
+                else:
+                    client.events.append(event)
+            self._condition.notify_all()
+
+    def stream(self, snapshot):
+        """Register a client and return its event stream, starting with a snapshot of the current status."""
+        with self._condition:
+            if len(self._clients) >= self.max_clients:
+                raise RetryLater(503, "Too many status stream clients", 30)
+            client = _Client()
+            self._clients.add(client)
+        cherrypy.request.hooks.attach(
+            "on_end_request", self._release, client=client
+        )  # Also runs when the request fails or is aborted before the stream starts
+        cherrypy.response.headers["Content-Type"] = "text/event-stream"
+        cherrypy.response.headers["Cache-Control"] = "no-cache"
+        cherrypy.response.headers["X-Accel-Buffering"] = "no"  # Do not buffer in nginx
+        cherrypy.response.stream = True
+        return self._events(client, snapshot)
+
+    def _events(self, client, snapshot):
+        try:
+            yield f"retry: 5000\nevent: snapshot\ndata: {snapshot}\n\n".encode("utf-8")
+            while True:
+                with self._condition:
+                    self._condition.wait_for(
+                        lambda: client.events or client.lost or self._stopped,
+                        self.keepalive,
+                    )
+                    if client.lost or self._stopped:
+                        return  # The client reconnects and gets a new snapshot
+                    events = list(client.events)
+                    client.events.clear()
+                yield b"".join(events) if events else b": keepalive\n\n"
+        finally:
+            self._release(client)
+
+    def _release(self, client):
+        """Free the slot of a client whose stream ended."""
+        with self._condition:
+            self._clients.discard(client)
+
+    def stop(self):
+        """End every open stream so the server can shut down."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+
+class _Client:
+    def __init__(self):
+        self.events = collections.deque()
+        self.lost = False
@@ -0,0 +1,445 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+
+class JsonStorage:
+    """Write-behind persistence of the catalog data to a single JSON file."""
+
+    def __init__(self, path, snapshot, interval_ms=500, max_mutations=100, lock=None):
+        self.path = path
+        self.snapshot = snapshot  # Callable returning the catalog data to persist
+        self.lock = (
+            lock or threading.Lock()
+        )  # Held by the writers of the catalog data while they change it
+        self.interval = interval_ms / 1000  # Maximum delay of a deferred mutation
+        self.max_mutations = max_mutations  # Pending mutations that force a flush
+        self._pending = 0  # Number of mutations not yet written to disk
+        self._pending_lock = threading.Lock()  # Protects the pending counter
+        self._write_lock = threading.Lock()  # Serializes snapshot writes
+        self._serialized = 0  # Number of the last snapshot serialized
+        self._written = 0  # Number of the last snapshot on disk
+        self._wakeup = threading.Event()  # Wakes the flusher before the interval
+        self._thread = None
+
+    def load(self):
+        """Load the catalog data from the JSON file, or return None if it does not exist."""
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def start(self):
+        """Start the background flusher thread."""
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True  # The thread will terminate when the program ends
+        self._thread.start()
+
+    def mark_dirty(self, durability="deferred"):
+        """Record a mutation; write it now if durability is "sync", otherwise leave it to the flusher."""
+        with self._pending_lock:
+            self._pending += 1
+            pending = self._pending
+        if durability == "sync":
+            self.flush()  # Concurrent sync writers are coalesced into one snapshot
+        elif pending >= self.max_mutations:
+            self._wakeup.set()  # Too many pending mutations, flush without waiting
+
+    def flush(self):
+        """Write one snapshot covering every mutation recorded so far."""
+        with self.lock:  # Serialize between mutations, the disk write happens outside
+            with self._pending_lock:
+                pending = self._pending
+                self._pending = 0
+            if not pending:  # Another writer already covered our mutations
+                return
+            data = json.dumps(self.snapshot(), separators=(",", ":"))
+            self._serialized += 1
+            number = self._serialized
+        with self._write_lock:
+            if number < self._written:  # A newer snapshot is already on disk
+                return
+            try:
+                self._write(data)
+                self._written = number
+            except OSError as e:
+                with self._pending_lock:
+                    self._pending += pending  # Retry on the next flush
+                print(f"Error saving catalog: {e}")
+
+    # Entity-level changes: the JSON file is always rewritten as a whole, so each of
+    # them simply marks the catalog dirty
+    def put_user(self, user, durability="deferred"):
+        self.mark_dirty(durability)
+
+    def delete_user(self, user_id, durability="deferred"):
+        self.mark_dirty(durability)
+
+    def put_dog(self, user_id, dog, durability="deferred"):
+        self.mark_dirty(durability)
+
+    def delete_dog(self, user_id, dog_id, durability="deferred"):
+        self.mark_dirty(durability)
+
+    def put_kennel(self, store_id, kennel, durability="deferred"):
+        self.mark_dirty(durability)
+
+    def put_device(self, device, durability="deferred"):
+        self.mark_dirty(durability)
+
+    def delete_device(self, device_id, durability="deferred"):
+        self.mark_dirty(durability)
+
+    def put_service(self, service, durability="deferred"):
+        self.mark_dirty(durability)
+
+    def delete_service(self, service_id, durability="deferred"):
+        self.mark_dirty(durability)
+
+    def _run(self):
+        """Flush pending mutations every interval, or sooner when too many pile up."""
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _write(self, data):
+        """Atomically replace the JSON file with the given data (temp file + fsync + rename)."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(
+            dir=directory, prefix=".catalog-", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)  # Fails if the file itself is a mount point
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)  # Make the rename itself durable
+            finally:
+                os.close(dir_fd)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class SqliteStorage:
+    """Row-level persistence of the catalog data to a SQLite database in WAL mode."""
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS Meta (
+            Key TEXT PRIMARY KEY,
+            Value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS Breeds (
+            BreedID INTEGER PRIMARY KEY,
+            Name TEXT,
+            Data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS Users (
+            UserID TEXT PRIMARY KEY,
+            Email TEXT NOT NULL,
+            Data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS UsersByEmail ON Users (Email);
+        CREATE TABLE IF NOT EXISTS Dogs (
+            DogID TEXT PRIMARY KEY,
+            UserID TEXT NOT NULL,
+            Name TEXT,
+            BreedID INTEGER,
+            Size TEXT,
+            Data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS DogsByUser ON Dogs (UserID);
+        CREATE INDEX IF NOT EXISTS DogsByBreed ON Dogs (BreedID);
+        CREATE TABLE IF NOT EXISTS Stores (
+            StoreID PRIMARY KEY,
+            Name TEXT,
+            Latitude REAL,
+            Longitude REAL,
+            Data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS Kennels (
+            StoreID NOT NULL,
+            KennelID NOT NULL,
+            Size TEXT NOT NULL,
+            Booked INTEGER NOT NULL,
+            Occupied INTEGER NOT NULL,
+            UnlockCode INTEGER,
+            PRIMARY KEY (StoreID, KennelID)
+        );
+        CREATE INDEX IF NOT EXISTS FreeKennels ON Kennels (StoreID, Size)
+            WHERE NOT Booked AND NOT Occupied;
+        CREATE TABLE IF NOT EXISTS Devices (
+            DeviceID PRIMARY KEY,
+            Name TEXT,
+            Data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS Services (
+            ServiceID PRIMARY KEY,
+            Name TEXT,
+            Data TEXT NOT NULL
+        );
+    """  # ID columns without a declared type keep the JSON type (int or str) of the IDs
+
+    def __init__(self, path, json_path, interval_ms=500, max_mutations=100):
+        self.path = path
+        self.json_path = json_path  # catalog.json to migrate from on first start
+        self.interval = interval_ms / 1000  # Maximum delay of a deferred commit
+        self.max_mutations = max_mutations  # Pending changes that force a commit
+        self._pending = 0  # Number of changes not yet committed
+        self._lock = threading.Lock()  # One connection shared by all request threads
+        self._wakeup = threading.Event()  # Wakes the committer before the interval
+        self._thread = None
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)  # Ensure the database directory exists
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "PRAGMA synchronous=FULL"
+        )  # Syncs the WAL at every commit, NORMAL may lose the last commits on power loss
+        self._db.executescript(self.schema)
+
+    def load(self):
+        """Load the catalog data from the database, migrating catalog.json on first start if there is one."""
+        with self._lock:
+            migrated = self._db.execute(
+                "SELECT Value FROM Meta WHERE Key = 'MigratedFrom'"
+            ).fetchone()
+            if not migrated:
+                self._migrate()
+            broker = self._db.execute(
+                "SELECT Value FROM Meta WHERE Key = 'broker'"
+            ).fetchone()
+            catalog_data = {
+                "broker": json.loads(broker[0]) if broker else {}
+            }  # Same sections as catalog.json, empty when there was nothing to migrate
+            catalog_data["Breeds"] = self._records("SELECT Data FROM Breeds")
+            catalog_data["Devices"] = self._records("SELECT Data FROM Devices")
+            catalog_data["Services"] = self._records("SELECT Data FROM Services")
+            dogs = {}  # UserID -> list of dogs
+            for user_id, data in self._db.execute(
+                "SELECT UserID, Data FROM Dogs ORDER BY rowid"
+            ):
+                dogs.setdefault(user_id, []).append(json.loads(data))
+            catalog_data["Users"] = []
+            for user in self._records("SELECT Data FROM Users"):
+                user["Dogs"] = dogs.get(user["UserID"], [])
+                catalog_data["Users"].append(user)
+            kennels = {}  # StoreID -> list of kennels
+            for store_id, kennel_id, size, booked, occupied, code in self._db.execute(
+                "SELECT StoreID, KennelID, Size, Booked, Occupied, UnlockCode "
+                "FROM Kennels ORDER BY rowid"
+            ):
+                kennels.setdefault(store_id, []).append(
+                    {
+                        "ID": kennel_id,
+                        "Size": size,
+                        "Booked": bool(booked),
+                        "Occupied": bool(occupied),
+                        "UnlockCode": code,
+                    }
+                )
+            catalog_data["Stores"] = []
+            for store in self._records("SELECT Data FROM Stores"):
+                store["Kennels"] = kennels.get(store["StoreID"], [])
+                catalog_data["Stores"].append(store)
+            return catalog_data
+
+    def _records(self, query):
+        """Decode the Data column of every row returned by the query, in insertion order."""
+        return [
+            json.loads(row[0]) for row in self._db.execute(query + " ORDER BY rowid")
+        ]
+
+    def _migrate(self):
+        """Import catalog.json into the empty database in a single transaction."""
+        try:
+            with open(self.json_path) as f:
+                catalog_data = json.load(f)
+        except FileNotFoundError:  # Still recorded, so the next start does not retry
+            catalog_data = {}
+        self._db.execute(
+            "INSERT INTO Meta (Key, Value) VALUES ('broker', ?)",
+            (json.dumps(catalog_data.get("broker", {})),),
+        )
+        for breed in catalog_data.get("Breeds", []):
+            self._db.execute(
+                "INSERT OR REPLACE INTO Breeds (BreedID, Name, Data) VALUES (?, ?, ?)",
+                (breed["BreedID"], breed.get("Name"), json.dumps(breed)),
+            )
+        for user in catalog_data.get("Users", []):
+            self._put_user(user)
+            for dog in user["Dogs"]:
+                self._put_dog(user["UserID"], dog)
+        for store in catalog_data.get("Stores", []):
+            location = store.get("Location") or [None, None]
+            self._db.execute(
+                "INSERT OR REPLACE INTO Stores (StoreID, Name, Latitude, Longitude, Data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    store["StoreID"],
+                    store.get("Name"),
+                    location[0],
+                    location[1],
+                    json.dumps({k: v for k, v in store.items() if k != "Kennels"}),
+                ),
+            )
+            for kennel in store["Kennels"]:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO Kennels "
+                    "(StoreID, KennelID, Size, Booked, Occupied, UnlockCode) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        store["StoreID"],
+                        kennel["ID"],
+                        kennel["Size"],
+                        kennel["Booked"],
+                        kennel["Occupied"],
+                        kennel.get("UnlockCode"),
+                    ),
+                )
+        for device in catalog_data.get("Devices", []):
+            self._put_device(device)
+        for service in catalog_data.get("Services", []):
+            self._put_service(service)
+        self._db.execute(
+            "INSERT INTO Meta (Key, Value) VALUES ('MigratedFrom', ?)",
+            (os.path.abspath(self.json_path),),
+        )
+        self._db.commit()
+        print(f"Migrated {self.json_path} into {self.path}")
+
+    def start(self):
+        """Start the background committer thread."""
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True  # The thread will terminate when the program ends
+        self._thread.start()
+
+    def flush(self):
+        """Commit every pending change."""
+        with self._lock:
+            if self._pending:
+                self._db.commit()
+                self._pending = 0
+
+    def _run(self):
+        """Commit deferred changes every interval, or sooner when too many pile up."""
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _apply(self, durability, change, *args):
+        """Run one change in the open transaction and commit it according to durability."""
+        with self._lock:
+            change(*args)
+            self._pending += 1
+            if durability == "sync":
+                self._db.commit()  # Also commits the deferred changes made so far
+                self._pending = 0
+            elif self._pending >= self.max_mutations:
+                self._wakeup.set()
+
+    def _put_user(self, user):
+        self._db.execute(
+            "INSERT INTO Users (UserID, Email, Data) VALUES (?, ?, ?) "
+            "ON CONFLICT (UserID) DO UPDATE SET Email = excluded.Email, Data = excluded.Data",
+            (
+                user["UserID"],
+                user["Email"],
+                json.dumps({k: v for k, v in user.items() if k != "Dogs"}),
+            ),
+        )
+
+    def _delete_user(self, user_id):
+        self._db.execute("DELETE FROM Dogs WHERE UserID = ?", (user_id,))
+        self._db.execute("DELETE FROM Users WHERE UserID = ?", (user_id,))
+
+    def _put_dog(self, user_id, dog):
+        self._db.execute(
+            "INSERT INTO Dogs (DogID, UserID, Name, BreedID, Size, Data) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (DogID) DO UPDATE SET UserID = excluded.UserID, "
+            "Name = excluded.Name, BreedID = excluded.BreedID, Size = excluded.Size, "
+            "Data = excluded.Data",
+            (
+                dog["DogID"],
+                user_id,
+                dog.get("Name"),
+                dog.get("BreedID"),
+                dog.get("Size"),
+                json.dumps(dog),
+            ),
+        )
+
+    def _delete_dog(self, user_id, dog_id):
+        self._db.execute(
+            "DELETE FROM Dogs WHERE UserID = ? AND DogID = ?", (user_id, dog_id)
+        )
+
+    def _put_kennel(self, store_id, kennel):
+        self._db.execute(
+            "UPDATE Kennels SET Size = ?, Booked = ?, Occupied = ?, UnlockCode = ? "
+            "WHERE StoreID = ? AND KennelID = ?",
+            (
+                kennel["Size"],
+                kennel["Booked"],
+                kennel["Occupied"],
+                kennel.get("UnlockCode"),
+                store_id,
+                kennel["ID"],
+            ),
+        )
+
+    def _put_device(self, device):
+        self._db.execute(
+            "INSERT INTO Devices (DeviceID, Name, Data) VALUES (?, ?, ?) "
+            "ON CONFLICT (DeviceID) DO UPDATE SET Name = excluded.Name, Data = excluded.Data",
+            (device.get("DeviceID"), device.get("Name"), json.dumps(device)),
+        )
+
+    def _delete_device(self, device_id):
+        self._db.execute("DELETE FROM Devices WHERE DeviceID = ?", (device_id,))
+
+    def _put_service(self, service):
+        self._db.execute(
+            "INSERT INTO Services (ServiceID, Name, Data) VALUES (?, ?, ?) "
+            "ON CONFLICT (ServiceID) DO UPDATE SET Name = excluded.Name, Data = excluded.Data",
+            (service.get("ServiceID"), service.get("Name"), json.dumps(service)),
+        )
+
+    def _delete_service(self, service_id):
+        self._db.execute("DELETE FROM Services WHERE ServiceID = ?", (service_id,))
+
+    def put_user(self, user, durability="deferred"):
+        self._apply(durability, self._put_user, user)
+
+    def delete_user(self, user_id, durability="deferred"):
+        self._apply(durability, self._delete_user, user_id)
+
+    def put_dog(self, user_id, dog, durability="deferred"):
+        self._apply(durability, self._put_dog, user_id, dog)
+
+    def delete_dog(self, user_id, dog_id, durability="deferred"):
+        self._apply(durability, self._delete_dog, user_id, dog_id)
+
+    def put_kennel(self, store_id, kennel, durability="deferred"):
+        self._apply(durability, self._put_kennel, store_id, kennel)
+
+    def put_device(self, device, durability="deferred"):
+        self._apply(durability, self._put_device, device)
+
+    def delete_device(self, device_id, durability="deferred"):
+        self._apply(durability, self._delete_device, device_id)
+
+    def put_service(self, service, durability="deferred"):
+        self._apply(durability, self._put_service, service)
+
+    def delete_service(self, service_id, durability="deferred"):
+        self._apply(durability, self._delete_service, service_id)
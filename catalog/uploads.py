@@ -0,0 +1,136 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+import cherrypy
+from cherrypy._cpreqbody import Part
+
+CHUNK_SIZE = 64 * 1024  # Bytes written to disk at once
+FORM_OVERHEAD = 64 * 1024  # Room for the other form fields and the part headers
+
+SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]  # Leading bytes of the accepted picture formats, WebP is checked separately
+
+
+def sniff(head):
+    """Return the picture type announced by the first bytes of a file, or None."""
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+class SpoolFile:
+    """Upload written to a temporary file as it arrives, hashed, size-limited and type-checked on the way."""
+
+    def __init__(self, directory, max_size):
+        os.makedirs(directory, exist_ok=True)
+        descriptor, self.name = tempfile.mkstemp(dir=directory, suffix=".part")
+        self._file = os.fdopen(
+            descriptor, "w+b", buffering=CHUNK_SIZE
+        )  # Small writes from the parser reach the disk in fixed chunks
+        self.max_size = max_size
+        self.size = 0
+        self.digest = hashlib.sha256()  # Content hash, computed while writing
+        self.content_type = None  # Set once enough bytes arrived to sniff it
+        self._head = b""
+
+    @classmethod
+    def copy_of(cls, file, directory, max_size):
+        """Spool a file object that was parsed without the stream_uploads tool."""
+        spool = cls(directory, max_size)
+        try:
+            shutil.copyfileobj(file, spool, CHUNK_SIZE)
+            spool.seek(0)
+        except Exception:
+            spool.discard()
+            raise
+        return spool
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:  # Stop before writing the rest to disk
+            self.discard()
+            raise cherrypy.HTTPError(
+                413, f"Upload larger than {self.max_size} bytes"
+            )  # CherryPy closes the connection instead of reading the remaining body
+        if self.content_type is None:
+            self._head += data[: 12 - len(self._head)]
+            if len(self._head) == 12:
+                self._check_type()
+        self.digest.update(data)
+        self._file.write(data)
+
+    def _check_type(self):
+        self.content_type = sniff(self._head)
+        if self.content_type is None:
+            self.discard()
+            raise cherrypy.HTTPError(
+                415, "Only JPEG, PNG, GIF and WebP pictures are accepted"
+            )
+
+    def seek(self, offset, whence=0):
+        if self.content_type is None:  # Files shorter than the signatures
+            self._check_type()
+        return self._file.seek(offset, whence)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def move(self, path):
+        """Atomically move the spooled file to its final path."""
+        self._file.close()
+        os.replace(self.name, path)
+        self.name = path
+
+    def discard(self):
+        """Close and delete the spooled file, unless it was moved."""
+        self._file.close()
+        if self.name.endswith(".part"):
+            try:
+                os.remove(self.name)
+            except FileNotFoundError:
+                pass
+
+
+class UploadPart(Part):
+    """Multipart part that spools file uploads through a SpoolFile instead of a plain temporary file."""
+
+    def make_file(self):
+        if not self.filename:  # Large regular fields keep CherryPy's behaviour
+            return super().make_file()
+        request = cherrypy.serving.request
+        spool = SpoolFile(*request.upload_settings)
+        request.spools.append(spool)
+        return spool
+
+
+def _discard_spools():
+    for spool in cherrypy.serving.request.spools:
+        spool.discard()  # Uploads the handler did not move into place
+
+
+def _stream_uploads(directory="uploads", max_size=10 * 1024 * 1024):
+    """Stream the file parts of multipart requests to disk, rejecting oversized or non-picture uploads early."""
+    request = cherrypy.serving.request
+    if not request.headers.get("Content-Type", "").startswith("multipart/form-data"):
+        return
+    length = request.headers.get("Content-Length")
+    if length and length.isdigit() and int(length) > max_size + FORM_OVERHEAD:
+        raise cherrypy.HTTPError(
+            413, f"Upload larger than {max_size} bytes"
+        )  # Rejected before reading any of the body
+    request.upload_settings = (directory, max_size)
+    request.spools = []
+    request.body.part_class = UploadPart
+    request.hooks.attach("on_end_request", _discard_spools)
+
+
+cherrypy.tools.stream_uploads = cherrypy.Tool("before_request_body", _stream_uploads)
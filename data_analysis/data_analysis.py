@@ -1,5 +1,5 @@
 import json
-from Libraries import PublisherSubscriber
+from Libraries import PublisherSubscriber, CatalogClient, Heartbeat
 import time
 import signal
 import requests
@@ -19,7 +19,15 @@ class DataAnalysis:
             clientID, broker, port, self
         )  # Initialize the MQTT client
         self.settings = json.load(open("settings.json"))  # Load settings from JSON file
-        self.catalog_url = self.settings["catalog_url"]  # Catalog URL from settings
+        self.catalog = CatalogClient(
+            self.settings["catalog_url"], "data_analysis"
+        )  # Pooled connections to the catalog, with retries and an ETag cache
+        self.beats = Heartbeat(
+            clientID, broker, port, "service", serviceID, base_topic=baseTopic
+        )  # Heartbeats and Last Will on IoTail/heartbeat/service/<ID>
+        self.reservation_manager = CatalogClient(
+            "http://reservation_manager:8083", "data_analysis"
+        )  # The same client works for the reservation manager's API
         if not firebase_admin._apps:  # Ensures Firebase is initialized only once
             cred = credentials.Certificate("firebase_account_key.json")
             firebase_admin.initialize_app(cred)  # Initialize Firebase Admin SDK
@@ -34,49 +42,28 @@ class DataAnalysis:
         )  # Dictionary to track HVAC status. Format: {kennelX: {"heating": bool, "cooling": bool, "humidifier": bool, "dehumidifier": bool}}
 
     def get_data(self):
-        """Fetches data from the catalog and reservation manager services to get breeds, dogs, and reservations."""
-        self.get_breeds()
+        """Fetches data from the catalog and reservation manager services to get dogs and reservations."""
         self.get_dogs()
         self.get_reservations()
 
-    def get_breeds(self):
-        """Fetches the list of breeds from the catalog service."""
-        headers = {
-            "Authorization": f"Bearer data_analysis",
-            "Content-Type": "application/json",
-        }
-        response = requests.get(
-            self.settings["catalog_url"] + "/breeds", headers=headers
-        )  # Make a GET request to the catalog service to fetch breeds
-        if response.status_code != 200:  # Check if the request was not successful
-            raise Exception("Failed to get breeds")
-        self.breeds = response.json()  # Store the list of breeds
-
     def get_dogs(self):
-        headers = {
-            "Authorization": f"Bearer data_analysis",
-            "Content-Type": "application/json",
-        }
-        response = requests.get(
-            self.settings["catalog_url"] + "/users", headers=headers
-        )  # Make a GET request to the catalog service to fetch users and their dogs
-        if response.status_code != 200:  # Check if the request was not successful
+        try:
+            dogs = (
+                self.catalog.get_dogs()
+            )  # Fetch the dogs with their thresholds, downloaded again only if they changed
+        except requests.exceptions.RequestException:
             raise Exception("Failed to get dogs")
-        self.dogs = [
-            dog for user in response.json() for dog in user["Dogs"] if user["Dogs"]
-        ]  # Flatten the list of dogs from all users
+        self.dogs = {
+            str(dog["DogID"]): dog for dog in dogs
+        }  # Index the dogs by DogID for a single lookup per sensor message
 
     def get_reservations(self):
-        headers = {
-            "Authorization": f"Bearer data_analysis",
-            "Content-Type": "application/json",
-        }
-        response = requests.get(
-            "http://reservation_manager:8083/status", headers=headers
-        )  # Make a GET request to the reservation manager service to fetch reservations
-        if response.status_code != 200:  # Check if the request was not successful
+        try:
+            self.reservations = self.reservation_manager.get(
+                "/status"
+            )  # Fetch the list of reservations from the reservation manager service
+        except requests.exceptions.RequestException:
             raise Exception("Failed to get reservations")
-        self.reservations = response.json()  # Store the list of reservations
 
     def start(self):
         """Starts the MQTT client and subscribes to the necessary topics."""
@@ -122,8 +109,8 @@ class DataAnalysis:
             return
 
         dog_id = reservation["dogID"]
-        dog_info = next(
-            (dog for dog in self.dogs if str(dog["DogID"]) == str(dog_id)), None
+        dog_info = self.dogs.get(
+            str(dog_id)
         )  # Find the dog information for the given dog ID
         if not dog_info:  # If no dog information is found, log an error and return
             print("No dog found for dog id", dog_id)
@@ -168,27 +155,7 @@ class DataAnalysis:
                         print(f"Error sending message: {e}")
             return
         # If the message comes from the temperature/humidity sensor
-        breed_id = dog_info.get("BreedID", 0)
-        if breed_id != 0:  # If the dog has a breed ID, fetch the breed information
-            breed_info = next(
-                (breed for breed in self.breeds if breed["BreedID"] == breed_id), None
-            )  # Find the breed information for the given breed ID
-            if (
-                breed_info is None
-            ):  # If no breed information is found, use default values
-                breed_info = {
-                    "MinIdealTemperature": 15,
-                    "MaxIdealTemperature": 30,
-                    "MinIdealHumidity": 20,
-                    "MaxIdealHumidity": 80,
-                }
-        else:  # If the dog has mixed breed, use values from the dog itself
-            breed_info = {
-                "MinIdealTemperature": dog_info.get("MinIdealTemperature", 15),
-                "MaxIdealTemperature": dog_info.get("MaxIdealTemperature", 30),
-                "MinIdealHumidity": dog_info.get("MinIdealHumidity", 20),
-                "MaxIdealHumidity": dog_info.get("MaxIdealHumidity", 80),
-            }
+        breed_info = dog_info  # Thresholds are already resolved by the catalog
 
         readings = {
             item.get("n", "temp_humid"): item.get("v", False)
@@ -474,36 +441,18 @@ class DataAnalysis:
 
     def stop(self):
         """Stops the MQTT client and performs any necessary cleanup."""
+        self.beats.stop()  # Announce the component as offline
         self.client.stop()
 
     def refresh(self):
-        """Periodically fetches data and sends heartbeats to the catalog service."""
+        """Periodically fetches the dogs and the reservations."""
         while True:
             self.get_data()
-            self.heartbeat()
             time.sleep(60)
 
     def heartbeat(self):
-        """Sends a heartbeat signal to the catalog service to indicate that the data_analysis service is running."""
-        try:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": "Bearer data_analysis",
-            }
-            url = self.catalog_url + "/heartbeat"
-            payload = {
-                "category": "service",
-                "serviceID": self.serviceID,
-            }
-            response = requests.post(
-                url, headers=headers, data=json.dumps(payload)
-            )  # Make a POST request to the catalog service to send a heartbeat
-            if response.status_code == 200:  # Check if the request was successful
-                print("Heartbeat sent successfully")
-            else:
-                print("Failed to send heartbeat")
-        except requests.exceptions.RequestException as e:
-            print(f"Error sending heartbeat: {e}")
+        """Announces the data analysis service as alive on MQTT every 60 seconds, until stop() is called."""
+        self.beats.run()
 
 
 def signal_handler(sig, frame):
@@ -520,10 +469,16 @@ if __name__ == "__main__":
 
     refresh_thread = threading.Thread(
         target=analysis.refresh
-    )  # Create a thread for the refresh function, which fetches data and sends heartbeats
+    )  # Create a thread for the refresh function, which fetches data
     refresh_thread.daemon = True  # The thread will terminate when the program ends
     refresh_thread.start()  # Start the refresh thread
 
+    heartbeat_thread = threading.Thread(
+        target=analysis.heartbeat
+    )  # Create a thread for the heartbeat function
+    heartbeat_thread.daemon = True  # The thread will terminate when the program ends
+    heartbeat_thread.start()  # Start the heartbeat thread
+
     analysis.start()  # Start the MQTT client
     # Subscription to topics for all types of sensors from all kennels
     analysis.subscribe(settings["baseTopic"] + "/+/sensors/+", 0)
@@ -0,0 +1,101 @@
+from Libraries import CatalogClient
+import json
+import time
+import signal
+import subprocess
+import sys
+import threading
+import requests
+
+
+class Gateway:
+    """Runs the device connectors, restarting the ones that exit, and registers their devices with one request."""
+
+    def __init__(self, connectors, interval=60):
+        self.connectors = connectors  # Scripts with the devices each one drives
+        self.interval = interval  # Seconds between checks of the connectors
+        self.catalog = CatalogClient(
+            json.load(open("settings.json"))["catalog_url"], "device_connector"
+        )  # Pooled connections to the catalog, with retries and an ETag cache
+        self.processes = {}  # Script -> running connector process
+        self.registered = False  # Set once the catalog accepted the devices
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Launches every device connector as its own process."""
+        for connector in self.connectors:
+            self.launch(connector)
+            time.sleep(1)  # Give each connector time to connect to the broker
+
+    def launch(self, connector):
+        """Starts the script of a connector, which sends the MQTT heartbeats of its devices."""
+        self.processes[connector["Script"]] = subprocess.Popen(
+            [sys.executable, connector["Script"]]
+        )
+
+    def register(self):
+        """Creates or updates every device in the catalog with a single request."""
+        devices = [
+            device for connector in self.connectors for device in connector["Devices"]
+        ]
+        try:
+            result = self.catalog.upsert_devices(
+                devices
+            )  # Harmless to repeat, so restarts do not duplicate devices
+            self.registered = True
+            print(f"Devices registered: {result}")
+        except requests.exceptions.RequestException as e:
+            print(f"Error registering devices: {e}")
+
+    def supervise(self):
+        """Registers the devices until the catalog accepts them and restarts the connectors that exit."""
+        while True:
+            if not self.registered:  # The catalog may start after the gateway
+                self.register()
+            for connector in self.connectors:
+                process = self.processes[connector["Script"]]
+                if (
+                    process.poll() is not None and not self._stopped.is_set()
+                ):  # Its Last Will marked its devices unavailable
+                    print(f"{connector['Script']} exited, restarting it")
+                    self.launch(connector)
+            if self._stopped.wait(self.interval):  # No restarts once stop() is called
+                return
+
+    def stop(self):
+        """Stops every device connector."""
+        self._stopped.set()
+        for process in self.processes.values():
+            process.send_signal(signal.SIGINT)  # The connectors clean up on Ctrl+C
+        for process in self.processes.values():
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.catalog.close()
+
+
+def signal_handler(sig, frame):
+    """Handles Ctrl+C and container shutdown to stop the connectors cleanly"""
+    print("\nStopping device gateway...")
+    gateway.stop()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    gateway = Gateway(
+        json.load(open("devices.json"))
+    )  # Load the connectors and devices
+    gateway.start()  # Start the device connectors
+
+    supervisor_thread = threading.Thread(
+        target=gateway.supervise
+    )  # Create a thread that registers the devices and restarts the connectors
+    supervisor_thread.daemon = True  # The thread will terminate when the program ends
+    supervisor_thread.start()  # Start the supervisor thread
+
+    signal.signal(signal.SIGINT, signal_handler)  # Wait for keyboard interruption
+    signal.signal(signal.SIGTERM, signal_handler)  # Sent by docker stop
+
+    # Keep the gateway running without a while loop
+    signal.pause()
@@ -1,10 +1,5 @@
 #!/bin/bash
 
-# This script launches multiple Python scripts to connect to various devices.
-python motion_sensor_connector.py &
-sleep 1s
-python temp_humid_connector.py &
-sleep 1s
-python led_connector.py &
-sleep 1s
-tail -f /dev/null # Keep the script running to maintain the connections
\ No newline at end of file
+# This script launches the gateway, which starts the Python scripts connecting to the various devices,
+# restarts the ones that exit and registers their devices with the catalog in a single request.
+exec python gateway.py # Replaces the shell, so docker stop reaches the gateway
@@ -1,23 +1,22 @@
 from gpiozero import LED
-from Libraries import Subscriber
+from Libraries import Subscriber, Heartbeat
 import time
 import json
 import signal
 import threading
-import requests
 
 
 class Led:
-    def __init__(self, pin, clientID, broker, port, deviceID):
+    def __init__(self, pin, clientID, broker, port, baseTopic, deviceID):
         self.deviceID = deviceID
         self.led = LED(pin)  # Initialize LED on specified GPIO pin
         self.clientID = clientID
         self.broker = broker
         self.port = port
         self.client = Subscriber(clientID, broker, port, self)  # Initialize MQTT client
-        self.catalog_url = json.load(open("settings.json"))[
-            "catalog_url"
-        ]  # Load catalog URL from settings
+        self.beats = Heartbeat(
+            clientID, broker, port, "sensor", deviceID, base_topic=baseTopic
+        )  # Heartbeats and Last Will on IoTail/heartbeat/sensor/<ID>
 
     def start(self):
         """Starts the MQTT client and connects to the broker."""
@@ -43,31 +42,12 @@ class Led:
 
     def stop(self):
         """Stops the MQTT client and turns off the LED."""
+        self.beats.stop()  # Announce the component as offline
         self.client.stop()
 
     def heartbeat(self):
-        """Sends a heartbeat signal to the catalog service every 60 seconds."""
-        while True:
-            try:
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": "Bearer led_connector",
-                }
-                url = self.catalog_url + "/heartbeat"
-                payload = {
-                    "category": "sensor",
-                    "deviceID": self.deviceID,
-                }
-                response = requests.post(
-                    url, headers=headers, data=json.dumps(payload)
-                )  # Send heartbeat to catalog service
-                if response.status_code == 200:  # Check if the heartbeat was successful
-                    print("Heartbeat sent successfully")
-                else:
-                    print("Failed to send heartbeat")
-            except requests.exceptions.RequestException as e:
-                print(f"Error sending heartbeat: {e}")
-            time.sleep(60)  # Wait for 60 seconds before sending the next heartbeat
+        """Announces the LED as alive on MQTT every 60 seconds, until stop() is called."""
+        self.beats.run()
 
 
 def signal_handler(sig, frame):
@@ -83,13 +63,13 @@ if __name__ == "__main__":
         open("mqtt_settings.json")
     )  # Load MQTT settings from a JSON file
     redled = Led(
-        21, "RedLED", settings["broker"], settings["port"], 3
+        21, "RedLED", settings["broker"], settings["port"], settings["baseTopic"], 3
     )  # Initialize Red LED
     greenled = Led(
-        26, "GreenLED", settings["broker"], settings["port"], 4
+        26, "GreenLED", settings["broker"], settings["port"], settings["baseTopic"], 4
     )  # Initialize Green LED
     yellowled = Led(
-        16, "YellowLED", settings["broker"], settings["port"], 5
+        16, "YellowLED", settings["broker"], settings["port"], settings["baseTopic"], 5
     )  # Initialize Yellow LED
     redled.start()  # Start Red LED
     greenled.start()  # Start Green LED
@@ -1,26 +1,25 @@
 from gpiozero import MotionSensor
-from Libraries import Publisher
+from Libraries import Publisher, Heartbeat
 import time
 import json
 import datetime
 import cherrypy
 import socket
-import requests
 import threading
 
 
 class PIRSensor:
     exposed = True
 
-    def __init__(self, clientID, broker, port, deviceID):
+    def __init__(self, clientID, broker, port, baseTopic, deviceID):
         self.deviceID = deviceID
         self.motion_sensor = MotionSensor(14)  # GPIO pin 14 for motion sensor
         self.broker = broker
         self.port = port
         self.client = Publisher(clientID, broker, port, self)  # Initialize MQTT client
-        self.catalog_url = json.load(open("settings.json"))[
-            "catalog_url"
-        ]  # Load catalog URL from settings
+        self.beats = Heartbeat(
+            clientID, broker, port, "sensor", deviceID, base_topic=baseTopic
+        )  # Heartbeats and Last Will on IoTail/heartbeat/sensor/<ID>
 
     def start(self):
         """Starts the MQTT client and connects to the broker."""
@@ -33,6 +32,7 @@ class PIRSensor:
 
     def stop(self):
         """Stops the MQTT client."""
+        self.beats.stop()  # Announce the component as offline
         self.client.stop()
 
     def GET(self):
@@ -51,34 +51,14 @@ class PIRSensor:
         )  # Returns the current motion status in JSON format
 
     def heartbeat(self):
-        """Sends a heartbeat signal to the catalog service every 60 seconds."""
-        while True:
-            try:
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": "Bearer motion_sensor",
-                }
-                url = self.catalog_url + "/heartbeat"
-                payload = {
-                    "category": "sensor",
-                    "deviceID": self.deviceID,
-                }
-                response = requests.post(
-                    url, headers=headers, data=json.dumps(payload)
-                )  # Send heartbeat
-                if response.status_code == 200:  # Check if the heartbeat was successful
-                    print("Heartbeat sent successfully")
-                else:
-                    print("Failed to send heartbeat")
-            except requests.exceptions.RequestException as e:
-                print(f"Error sending heartbeat: {e}")
-            time.sleep(60)  # Wait for 60 seconds before sending the next heartbeat
+        """Announces the motion sensor as alive on MQTT every 60 seconds, until stop() is called."""
+        self.beats.run()
 
 
 if __name__ == "__main__":
     settings = json.load(open("mqtt_settings.json"))  # Load MQTT settings
     motion_sensor = PIRSensor(
-        "MotionSensor", settings["broker"], settings["port"], 2
+        "MotionSensor", settings["broker"], settings["port"], settings["baseTopic"], 2
     )  # Initialize PIR sensor with clientID, broker, port, and deviceID
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     s.connect(("8.8.8.8", 80))
@@ -1,4 +1,4 @@
-from Libraries import Publisher
+from Libraries import Publisher, Heartbeat
 import time
 import json
 import board
@@ -6,14 +6,13 @@ import adafruit_dht
 import datetime
 import cherrypy
 import socket
-import requests
 import threading
 
 
 class TempHumidSensor:
     exposed = True
 
-    def __init__(self, clientID, broker, port, deviceID):
+    def __init__(self, clientID, broker, port, baseTopic, deviceID):
         self.deviceID = deviceID
         self.temp_humid_sensor = adafruit_dht.DHT11(
             board.D15, use_pulseio=False
@@ -21,9 +20,9 @@ class TempHumidSensor:
         self.broker = broker
         self.port = port
         self.client = Publisher(clientID, broker, port, self)  # Initialize MQTT client
-        self.catalog_url = json.load(open("settings.json"))[
-            "catalog_url"
-        ]  # Load catalog URL from settings
+        self.beats = Heartbeat(
+            clientID, broker, port, "sensor", deviceID, base_topic=baseTopic
+        )  # Heartbeats and Last Will on IoTail/heartbeat/sensor/<ID>
 
     def start(self):
         """Starts the MQTT client and connects to the broker."""
@@ -36,6 +35,7 @@ class TempHumidSensor:
 
     def stop(self):
         """Stops the MQTT client."""
+        self.beats.stop()  # Announce the component as offline
         self.client.stop()
 
     def GET(self):
@@ -62,34 +62,18 @@ class TempHumidSensor:
         )  # Returns the current temperature and humidity in JSON format
 
     def heartbeat(self):
-        """Sends a heartbeat signal to the catalog service every 60 seconds."""
-        while True:
-            try:
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": "Bearer temp_humid_sensor",
-                }
-                url = self.catalog_url + "/heartbeat"
-                payload = {
-                    "category": "sensor",
-                    "deviceID": self.deviceID,
-                }
-                response = requests.post(
-                    url, headers=headers, data=json.dumps(payload)
-                )  # Send heartbeat to catalog service
-                if response.status_code == 200:  # Check if the heartbeat was successful
-                    print("Heartbeat sent successfully")
-                else:
-                    print("Failed to send heartbeat")
-            except requests.exceptions.RequestException as e:
-                print(f"Error sending heartbeat: {e}")
-            time.sleep(60)  # Wait for 60 seconds before sending the next heartbeat
+        """Announces the sensor as alive on MQTT every 60 seconds, until stop() is called."""
+        self.beats.run()
 
 
 if __name__ == "__main__":
     settings = json.load(open("mqtt_settings.json"))  # Load MQTT settings
     temp_humid_sensor = TempHumidSensor(
-        "TempHumidSensor", settings["broker"], settings["port"], 1
+        "TempHumidSensor",
+        settings["broker"],
+        settings["port"],
+        settings["baseTopic"],
+        1,
     )  # Initialize TempHumidSensor with MQTT settings
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     s.connect(("8.8.8.8", 80))
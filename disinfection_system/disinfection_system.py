@@ -1,8 +1,7 @@
 import json
 import time
-from Libraries import PublisherSubscriber
+from Libraries import PublisherSubscriber, Heartbeat
 import signal
-import requests
 import threading
 
 
@@ -16,9 +15,9 @@ class DisinfectionSystem:
         self.client = PublisherSubscriber(
             clientID, broker, port, self
         )  # Initialize MQTT client
-        self.catalog_url = json.load(open("settings.json"))[
-            "catalog_url"
-        ]  # Load catalog URL from settings
+        self.beats = Heartbeat(
+            clientID, broker, port, "service", serviceID, base_topic=baseTopic
+        )  # Heartbeats and Last Will on IoTail/heartbeat/service/<ID>
 
     def start(self):
         """Starts the MQTT client and connects to the broker."""
@@ -44,6 +43,7 @@ class DisinfectionSystem:
 
     def stop(self):
         """Stops the MQTT client."""
+        self.beats.stop()  # Announce the component as offline
         self.client.stop()
 
     def disinfect_kennel(self, kennel_id):
@@ -58,28 +58,8 @@ class DisinfectionSystem:
         )  # Publish disinfection status to the kennel's status topic
 
     def heartbeat(self):
-        """Sends a heartbeat signal to the catalog service to indicate that the disinfection system is active."""
-        while True:
-            try:
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": "Bearer disinfection_system",
-                }
-                url = self.catalog_url + "/heartbeat"
-                payload = {
-                    "category": "service",
-                    "serviceID": self.serviceID,
-                }
-                response = requests.post(
-                    url, headers=headers, data=json.dumps(payload)
-                )  # Send heartbeat to catalog service
-                if response.status_code == 200:  # Heartbeat sent successfully
-                    print("Heartbeat sent successfully")
-                else:
-                    print("Failed to send heartbeat")
-            except requests.exceptions.RequestException as e:
-                print(f"Error sending heartbeat: {e}")
-            time.sleep(60)
+        """Announces the disinfection system as alive on MQTT every 60 seconds, until stop() is called."""
+        self.beats.run()
 
 
 def signal_handler(sig, frame):
@@ -4,22 +4,39 @@ import uuid
 import socket
 import cherrypy
 import requests
-import jwt
 import threading
-from Libraries import PublisherSubscriber
+from Libraries import (
+    PublisherSubscriber,
+    TokenCache,
+    ResponseEncoder,
+    CatalogClient,
+    Heartbeat,
+)
 import firebase_admin
 from firebase_admin import credentials, messaging, exceptions
 
 
 class ReservationManager:
     exposed = True
+    dimension_order = {
+        "Small": 0,
+        "Medium": 1,
+        "Large": 2,
+    }  # A kennel can host dogs of its size or smaller
 
     def __init__(self, reservation_file, clientID, broker, port, baseTopic, serviceID):
         with open("secret_key.txt") as f:
             self.secret_key = f.read()  # Load the secret key from a file
-        self.catalog_url = json.load(open("settings.json"))[
-            "catalog_url"
-        ]  # Load catalog URL from settings
+        self.tokens = TokenCache(
+            self.secret_key,
+            ["data_analysis"],  # Special case for data analysis token
+        )  # Verified JWT tokens, kept until they expire
+        self.catalog = CatalogClient(
+            json.load(open("settings.json"))["catalog_url"], "reservation_manager"
+        )  # Pooled connections to the catalog, with retries and an ETag cache
+        self.beats = Heartbeat(
+            clientID, broker, port, "service", serviceID, base_topic=baseTopic
+        )  # Heartbeats and Last Will on IoTail/heartbeat/service/<ID>
         self.get_stores()  # Load the store settings from the catalog
         self.reservation_file = reservation_file
         self.clientID = clientID
@@ -73,6 +90,7 @@ class ReservationManager:
 
     def stop(self):
         """Stops the MQTT client."""
+        self.beats.stop()  # Announce the component as offline
         self.client.stop()
 
     def notify(self, topic, msg):
@@ -97,50 +115,39 @@ class ReservationManager:
 
     def get_user(self, userID):
         """Fetches user details from the catalog service."""
-        headers = {
-            "Authorization": f"Bearer reservation_manager",
-            "Content-Type": "application/json",
-        }
-        response = requests.get(
-            f"{self.catalog_url}/users/{userID}", headers=headers
-        )  # Get user details from the catalog service
-        if response.ok:  # If the response is successful
-            return response.json()  # Return the user details as JSON
-        print("Couldn't get users")
-        raise cherrypy.HTTPError(
-            404, "User not found"
-        )  # If the user is not found, raise an error
+        try:
+            return self.catalog.get_user(
+                userID
+            )  # Get user details from the catalog service
+        except requests.exceptions.RequestException:
+            print("Couldn't get users")
+            raise cherrypy.HTTPError(
+                404, "User not found"
+            )  # If the user is not found, raise an error
 
     def get_stores(self):
         """Fetches store settings from the catalog service."""
-        headers = {
-            "Authorization": f"Bearer reservation_manager",
-            "Content-Type": "application/json",
-        }
-        response = requests.get(
-            f"{self.catalog_url}/stores", headers=headers
-        )  # Get store settings from the catalog service
-        if response.ok:  # If the response is successful
+        try:
             self.settings = (
-                response.json()
-            )  # Store the settings in the instance variable
-        else:
+                self.catalog.get_stores()
+            )  # Downloaded again only if the stores changed since the last call
+        except requests.exceptions.RequestException:
             print("Couldn't get stores")
             exit(1)
 
-    def verify_token(self, token):
-        """Verifies the JWT token."""
-        if token == "data_analysis":  # Special case for data analysis token
-            return token
+    def count_free_kennels(self, storeID, dog_size):
+        """Asks the catalog how many free kennels of a store can host a dog of the given size."""
         try:
-            decoded = jwt.decode(
-                token, self.secret_key, algorithms=["HS256"]
-            )  # Decode the JWT token using the secret key
-            return decoded
-        except jwt.ExpiredSignatureError:  # If the token has expired
-            raise cherrypy.HTTPError(401, "Token has expired")
-        except jwt.InvalidTokenError:  # If the token is invalid
-            raise cherrypy.HTTPError(401, "Invalid token")
+            summary = self.catalog.get_store_summary(
+                storeID
+            )  # Get the kennel counters of the store from the catalog service
+        except requests.exceptions.RequestException:  # If the store is not found
+            raise cherrypy.HTTPError(404, "Store not found")
+        return sum(
+            counts["Free"]
+            for size, counts in summary["Kennels"].items()
+            if self.dimension_order[size] >= self.dimension_order[dog_size]
+        )  # Kennels of the dog's size or larger
 
     def save_reservations(self):
         """Saves the current reservations to the reservation file."""
@@ -176,6 +183,14 @@ class ReservationManager:
         storeID = data.get("storeID")
         dog_size = data.get("dog_size")
 
+        if dog_size not in self.dimension_order:  # Checked before looking for kennels
+            raise cherrypy.HTTPError(
+                400, f"dog_size must be one of {', '.join(self.dimension_order)}"
+            )
+        if (
+            self.count_free_kennels(storeID, dog_size) == 0
+        ):  # Fail fast using the catalog's counters, without walking the kennels
+            raise cherrypy.HTTPError(404, "No available kennels")
         store = next(
             (s for s in self.settings if s["StoreID"] == storeID),
             None,
@@ -183,6 +198,13 @@ class ReservationManager:
         kennelID = self.find_available_kennel(
             store, dog_size
         )  # Find an available kennel for the dog size
+        if kennelID is None:  # The local copy of the stores is stale, refresh it once
+            self.get_stores()
+            store = next(
+                (s for s in self.settings if s["StoreID"] == storeID),
+                None,
+            )
+            kennelID = self.find_available_kennel(store, dog_size)
         if kennelID is not None:  # If an available kennel is found
             reservationID = str(
                 uuid.uuid4()
@@ -385,19 +407,13 @@ class ReservationManager:
 
     def book_kennel(self, storeID: int, kennel: int):
         """Books a kennel for a reservation."""
-        headers = {
-            "Authorization": "Bearer reservation_manager",
-            "Content-Type": "application/json",
-        }
-        body = json.dumps(
-            {"storeID": storeID, "kennel": kennel}
-        )  # Prepare the request body with store ID and kennel number
-        response = requests.post(
-            f"{self.catalog_url}/book",
-            headers=headers,
-            data=body,
-        )  # Send a request to book the kennel
-        if response.ok:  # If the response is successful
+        try:
+            result = self.catalog.book_kennel(
+                storeID, kennel
+            )  # Send a request to book the kennel
+        except requests.exceptions.RequestException:
+            result = None
+        if result is not None:  # If the response is successful
             message = {"message": "off"}
             self.publish(
                 self.baseTopic + "/kennel1/leds/greenled", message, 2
@@ -406,24 +422,20 @@ class ReservationManager:
             self.publish(
                 self.baseTopic + "/kennel1/leds/yellowled", message, 2
             )  # SHOULD BE "kennel{kennelID}/leds/yellowled" but we have just one led per color. Turn on the yellow LED
-            return json.loads(response.text)
+            return result
         raise cherrypy.HTTPError(
             500, "Error booking kennel"
         )  # If the booking fails, return an HTTP error
 
     def free_kennel(self, storeID: int, kennel: int):
         """Frees a booked kennel."""
-        headers = {
-            "Authorization": "Bearer reservation_manager",
-            "Content-Type": "application/json",
-        }
-        body = json.dumps({"storeID": storeID, "kennel": kennel})
-        response = requests.post(
-            f"{self.catalog_url}/free",
-            headers=headers,
-            data=body,
-        )  # Send a request to free the kennel
-        if response.ok:  # If the response is successful
+        try:
+            result = self.catalog.free_kennel(
+                storeID, kennel
+            )  # Send a request to free the kennel
+        except requests.exceptions.RequestException:
+            result = None
+        if result is not None:  # If the response is successful
             message = {"message": "off"}
             self.publish(
                 self.baseTopic + "/kennel1/leds/yellowled", message, 2
@@ -432,24 +444,20 @@ class ReservationManager:
             self.publish(
                 self.baseTopic + "/kennel1/leds/greenled", message, 2
             )  # SHOULD BE f"kennel{kennelID}/leds/greenled" but we have just one led per color. Turn on the green LED
-            return json.loads(response.text)
+            return result
         raise cherrypy.HTTPError(
             500, "Error unlocking kennel"
         )  # If the freeing fails, return an HTTP error
 
     def occupy_kennel(self, storeID: int, kennel: int):
         """Occupies a booked kennel."""
-        headers = {
-            "Authorization": "Bearer reservation_manager",
-            "Content-Type": "application/json",
-        }
-        body = json.dumps({"storeID": storeID, "kennel": kennel})
-        response = requests.post(
-            f"{self.catalog_url}/lock",
-            headers=headers,
-            data=body,
-        )  # Send a request to occupy the kennel
-        if response.ok:  # If the response is successful
+        try:
+            result = self.catalog.lock_kennel(
+                storeID, kennel
+            )  # Send a request to occupy the kennel
+        except requests.exceptions.RequestException:
+            result = None
+        if result is not None:  # If the response is successful
             message = {"message": "off"}
             self.publish(
                 self.baseTopic + "/kennel1/leds/greenled", message, 2
@@ -461,7 +469,7 @@ class ReservationManager:
             self.publish(
                 self.baseTopic + "/kennel1/leds/redled", message, 2
             )  # SHOULD BE "kennel{kennelID}/leds/redled" but we have just one led per color. Turn on the red LED
-            return json.loads(response.text)
+            return result
         raise cherrypy.HTTPError(
             500, "Error unlocking kennel"
         )  # If the occupation fails, return an HTTP error
@@ -529,10 +537,9 @@ class ReservationManager:
             not auth_header
         ):  # If the Authorization header is not present, return an HTTP error
             raise cherrypy.HTTPError(401, "Authorization token required")
-        token = auth_header.split(" ")[
-            1
-        ]  # Extract the token from the Authorization header
-        self.verify_token(token)  # Verify the token
+        self.tokens.authorize(
+            auth_header
+        )  # Parse the Bearer token and verify it, using the token cache
         body = cherrypy.request.body.read()
         data = json.loads(body)
         if uri[0] == "reserve":  # If the request is for reservation
@@ -561,10 +568,9 @@ class ReservationManager:
             not auth_header
         ):  # If the Authorization header is not present, return an HTTP error
             raise cherrypy.HTTPError(401, "Authorization token required")
-        token = auth_header.split(" ")[
-            1
-        ]  # Extract the token from the Authorization header
-        self.verify_token(token)  # Verify the token
+        self.tokens.authorize(
+            auth_header
+        )  # Parse the Bearer token and verify it, using the token cache
         if uri[0] == "status":  # If the request is for status
             if len(uri) > 1:  # If a user ID is provided
                 reservations = [
@@ -589,10 +595,9 @@ class ReservationManager:
             not auth_header
         ):  # If the Authorization header is not present, return an HTTP error
             raise cherrypy.HTTPError(401, "Authorization token required")
-        token = auth_header.split(" ")[
-            1
-        ]  # Extract the token from the Authorization header
-        self.verify_token(token)  # Verify the token
+        self.tokens.authorize(
+            auth_header
+        )  # Parse the Bearer token and verify it, using the token cache
         if uri[0] == "cancel":  # If the request is for cancellation
             reservationID = uri[1]
             return self.handle_cancellation(
@@ -603,28 +608,8 @@ class ReservationManager:
         )  # If the endpoint is not found, return an HTTP error
 
     def heartbeat(self):
-        """Sends a heartbeat signal to the catalog service to indicate that the reservation manager is active."""
-        while True:
-            try:
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": "Bearer reservation_manager",
-                }
-                url = self.catalog_url + "/heartbeat"
-                payload = {
-                    "category": "service",
-                    "serviceID": self.serviceID,
-                }
-                response = requests.post(
-                    url, headers=headers, data=json.dumps(payload)
-                )  # Send a POST request to the catalog service
-                if response.status_code == 200:  # If the response is successful
-                    print("Heartbeat sent successfully")
-                else:
-                    print("Failed to send heartbeat")
-            except requests.exceptions.RequestException as e:
-                print(f"Error sending heartbeat: {e}")
-            time.sleep(60)  # Wait for 60 seconds before sending the next heartbeat
+        """Announces the reservation manager as alive on MQTT every 60 seconds, until stop() is called."""
+        self.beats.run()
 
 
 if __name__ == "__main__":
@@ -644,12 +629,16 @@ if __name__ == "__main__":
     s.connect(("8.8.8.8", 80))
     ip = s.getsockname()[0]
     s.close()
+    cherrypy.tools.encode_response = (
+        ResponseEncoder().tool()
+    )  # Compressed or MessagePack bodies for the clients that ask for them
     # CherryPy configuration
     conf = {
         "/": {
             "request.dispatch": cherrypy.dispatch.MethodDispatcher(),
             "tools.sessions.on": True,
             "request.show_tracebacks": False,
+            "tools.encode_response.on": True,
         }
     }
 
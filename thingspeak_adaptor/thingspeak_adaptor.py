@@ -1,24 +1,36 @@
 import json
 import requests
-from Libraries import Subscriber
+from Libraries import Subscriber, TokenCache, ResponseEncoder, Heartbeat
 import time
 import threading
 import requests
 import socket
 import cherrypy
-import jwt
 from datetime import datetime
 
 
 class ThingspeakAdaptor:
     exposed = True
 
-    def __init__(self, clientID, broker, port, serviceID):
+    def __init__(self, clientID, broker, port, baseTopic, serviceID):
         with open("settings.json") as f:
             self.settings = json.load(f)  # Load settings from a JSON file
 
         with open("secret_key.txt") as f:
             self.secret_key = f.read()  # Read the secret key from a file
+        self.tokens = TokenCache(
+            self.secret_key,
+            [
+                "reservation_manager",
+                "data_analysis",
+                "temp_humid_sensor",
+                "motion_sensor",
+                "led_connector",
+                "camera",
+                "thingspeak_adaptor",
+                "disinfection_system",
+            ],  # Allow specific tokens without verification for simplicity
+        )  # Verified JWT tokens, kept until they expire
 
         self.clientID = clientID
         self.serviceID = serviceID
@@ -28,7 +40,9 @@ class ThingspeakAdaptor:
             clientID, broker, port, self
         )  # Initialize the MQTT client
 
-        self.catalog_url = self.settings["catalog_url"]  # URL of the catalog service
+        self.beats = Heartbeat(
+            clientID, broker, port, "service", serviceID, base_topic=baseTopic
+        )  # Heartbeats and Last Will on IoTail/heartbeat/service/<ID>
         self.thingspeak_write_api_key = self.settings[
             "thingspeak_write_api_key"
         ]  # API key for writing to Thingspeak
@@ -92,6 +106,7 @@ class ThingspeakAdaptor:
 
     def stop(self):
         """Stops the MQTT client."""
+        self.beats.stop()  # Announce the component as offline
         self.client.stop()
 
     def fetch_thingspeak_data(self, kennelID, startDate):
@@ -151,53 +166,8 @@ class ThingspeakAdaptor:
             )
 
     def heartbeat(self):
-        """Sends a heartbeat signal to the catalog service every 60 seconds."""
-        while True:
-            try:
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": "Bearer thingspeak_adaptor",
-                }
-                url = self.catalog_url + "/heartbeat"
-                payload = {
-                    "category": "service",
-                    "serviceID": self.serviceID,
-                }
-                response = requests.post(
-                    url, headers=headers, data=json.dumps(payload)
-                )  # Sends heartbeat to the catalog service
-                if response.status_code == 200:  # Heartbeat sent successfully
-                    print("Heartbeat sent successfully")
-                else:
-                    print("Failed to send heartbeat")
-            except requests.exceptions.RequestException as e:
-                print(f"Error sending heartbeat: {e}")
-            time.sleep(60)  # Waits for 60 seconds before sending the next heartbeat
-
-    def verify_token(self, token):
-        """Verify the JWT token and return the decoded data or raise an error."""
-        if token in [
-            "reservation_manager",
-            "data_analysis",
-            "temp_humid_sensor",
-            "motion_sensor",
-            "led_connector",
-            "camera",
-            "thingspeak_adaptor",
-            "disinfection_system",
-        ]:  # Allow specific tokens without verification for simplicity
-            return token
-        try:
-            decoded = jwt.decode(
-                token, self.secret_key, algorithms=["HS256"]
-            )  # Decode the JWT token using the secret key
-            return decoded
-        except (
-            jwt.ExpiredSignatureError
-        ):  # If the token has expired, return an HTTP error
-            raise cherrypy.HTTPError(401, "Token has expired")
-        except jwt.InvalidTokenError:  # If the token is invalid, return an HTTP error
-            raise cherrypy.HTTPError(401, "Invalid token")
+        """Announces the Thingspeak adaptor as alive on MQTT every 60 seconds, until stop() is called."""
+        self.beats.run()
 
     def GET(self, *uri, **params):
         """Handles GET requests to the Thingspeak adaptor."""
@@ -209,10 +179,9 @@ class ThingspeakAdaptor:
         ):  # If the Authorization header is not present, return an HTTP error
             raise cherrypy.HTTPError(401, "Authorization token required")
         else:
-            token = auth_header.split(" ")[
-                1
-            ]  # Extract the token from the Authorization header
-            self.verify_token(token)  # Verify the token for the route
+            self.tokens.authorize(
+                auth_header
+            )  # Parse the Bearer token and verify it, using the token cache
 
         if uri[0] == "measurements":
             kennelID = int(
@@ -237,13 +206,21 @@ if __name__ == "__main__":
     ip = s.getsockname()[0]  # getting the IP address of the container
     s.close()
     adaptor = ThingspeakAdaptor(
-        "ThingspeakAdaptor", settings["broker"], settings["port"], 4
+        "ThingspeakAdaptor",
+        settings["broker"],
+        settings["port"],
+        settings["baseTopic"],
+        4,
     )  # Initialize the ThingspeakAdaptor with settings
+    cherrypy.tools.encode_response = (
+        ResponseEncoder().tool()
+    )  # Compressed or MessagePack bodies for the clients that ask for them
     conf = {
         "/": {
             "request.dispatch": cherrypy.dispatch.MethodDispatcher(),
             "tools.sessions.on": True,
             "request.show_tracebacks": False,
+            "tools.encode_response.on": True,
         }
     }  # Configuration for the CherryPy server
     cherrypy.tree.mount(